@@ -15,6 +15,8 @@ budget='8'
 
 for b in $budget
 do
+  # All 9 starting points with one model per budget, instead of the loops below.
+  # $PATH/src/mip_test.py -n $b --multi_start 1 1 1 5 1 9 5 1 5 5 5 9 9 1 9 5 9 9 -t 10800 -r glider1 -o $outfile_path --experiment_name $experiment_name
   for x in $xPoints
   do
     for y in $yPoints
@@ -0,0 +1,99 @@
+#!/home/mlfrantz/miniconda2/bin/python3.6
+
+"""
+Beam search planner, a deeper look ahead than greedy.py for comparison to the MIP.
+
+Every robot keeps the --beam_width best partial paths (by the sum of the field over
+their waypoints). Each step all of them are moved in every direction of -d at once
+as NumPy arrays, the moves leaving the map or, with --same_point, back onto a point
+of their own path are dropped, and the best --beam_width are kept. With --beam_depth
+k the search only looks k steps ahead, takes the first step of the best partial path
+and searches again from there. By default it searches the whole budget in one go.
+
+Takes the arguments of greedy.py (and its sweeps) and writes the same CSV rows with
+'Beam' as the algorithm.
+"""
+
+import numpy as np
+from greedy import get_parser, plan, greedy_path, point_keys, field_values
+from sweep import sweep_configs
+
+def beam_search(grid, path, num_steps, moves, same_point=True, width=100, visited=[]):
+    # Searches num_steps steps on from the end of path. Returns the best continuation
+    # (without the last point of path), shorter if every partial path got stuck.
+    pos = np.array([path[-1]], dtype=float)
+    score = np.zeros(1)
+    keys = np.array([point_keys(list(visited) + path)], dtype=np.int64)
+    trail = np.zeros((1, 0, 2))
+    for s in range(num_steps):
+        n = len(pos)
+        candidates = (pos[:,None,:] + moves[None,:,:]).reshape(-1, 2)
+        parent = np.repeat(np.arange(n), len(moves))
+        # Makes sure we are in
+        valid = (candidates[:,0] >= 0) & (candidates[:,0] <= grid.shape[0]-1) & \
+                (candidates[:,1] >= 0) & (candidates[:,1] <= grid.shape[1]-1)
+        new_keys = np.array(point_keys(candidates), dtype=np.int64)
+        if same_point:
+            valid &= ~np.any(keys[parent] == new_keys[:,None], axis=1)
+        if not valid.any():
+            break
+        candidates = candidates[valid]
+        parent = parent[valid]
+        new_keys = new_keys[valid]
+        values = score[parent] + field_values(grid, candidates)
+        if len(values) > width:
+            keep = np.argpartition(-values, width - 1)[:width]
+        else:
+            keep = np.arange(len(values))
+        pos = candidates[keep]
+        score = values[keep]
+        keys = np.concatenate((keys[parent[keep]], new_keys[keep,None]), axis=1)
+        trail = np.concatenate((trail[parent[keep]], pos[:,None,:]), axis=1)
+    return trail[np.argmax(score)].tolist()
+
+def beam_path(field, start, num_steps, vel, directions, same_point=True, width=100, depth=0, visited=[]):
+    # Beam search path for a single robot, same arguments and result as
+    # greedy_path. depth is how many steps each search looks ahead, 0 for all of
+    # them. If every partial path gets stuck the rest is filled in by greedy_path.
+    grid = field[:,:,0] if field.ndim == 3 else field
+    moves = vel*np.array(directions, dtype=float)
+    path = [start]
+    while len(path) < num_steps:
+        left = num_steps - len(path)
+        ahead = left if depth <= 0 else min(depth, left)
+        steps = beam_search(grid, path, ahead, moves, same_point, width, visited)
+        if len(steps) == 0:
+            path += greedy_path(field, path[-1], left + 1, vel, directions, same_point, list(visited) + path[:-1])[1:]
+            break
+        path += steps if ahead == left else steps[:1]
+    return path
+
+def main():
+    parser = get_parser()
+    parser.description = 'Beam search planner'
+    parser.add_argument(
+        '--beam_width',
+        nargs='?',
+        type=int,
+        default=100,
+        help='Number of partial paths kept each step.',
+        )
+    parser.add_argument(
+        '--beam_depth',
+        nargs='?',
+        type=int,
+        default=0,
+        help='Steps each search looks ahead before taking a step. Default (0) searches the whole path at once.',
+        )
+    args = parser.parse_args()
+    if args.joint:
+        parser.error("--joint is greedy.py's team planner, the beam search plans each robot on its own.")
+
+    def path_planner(field, start, num_steps, vel, directions, same_point):
+        return beam_path(field, start, num_steps, vel, directions, same_point, args.beam_width, args.beam_depth)
+
+    for run_args in sweep_configs(args):
+        plan(run_args, path_planner, 'Beam')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/home/mlfrantz/miniconda2/bin/python3.6
+
+"""
+Cache of solved mip_test.py runs.
+
+A run is keyed by a hash of everything the plan depends on: the field the model is
+built from, the robots (steps, speeds and robots.yaml entries), the start points,
+the budget, every model and solver argument, the contents of --param_file and the
+planner code itself. With --cache_dir, mip_test.py looks the key up before solving
+and uses the stored plan on a hit. --force_solve solves again and overwrites it.
+
+Every entry is a directory named by the key in --cache_dir holding
+
+    result.yaml  the paths, objective, run time and solver stats of the run, and
+                 the arguments it was made with
+    model.mps    the model (gurobi backend, plain solves only)
+
+Run this file to look after the cache:
+
+    cache.py list  --cache_dir DIR               one line per entry
+    cache.py prune --cache_dir DIR [--days N]    deletes the entries older than N
+                                                 days, all of them without --days
+"""
+
+import os, sys, time, shutil, hashlib, argparse
+import oyaml as yaml
+import numpy as np
+
+# Arguments that do not change the plan, left out of the key.
+IGNORED_ARGS = ['outfile_path', 'experiment_name', 'gen_image', 'trace_dir', 'cache_dir', 'force_solve',
+                'sweep_starts', 'sweep_budgets', 'sweep_centers', 'multi_start', 'horizon_compare',
+                'incremental', 'sim_cfg', 'robots_cfg', 'param_file']
+
+# The planner code, a change to any of these gives new keys.
+CODE_FILES = ['mip_test.py', 'mip_backend.py', 'greedy.py']
+
+def cache_key(args, field_slices, steps, velocity_correction, start, configs):
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(field_slices, dtype=float).tobytes())
+    h.update(str(np.shape(field_slices)).encode())
+    h.update(repr(([len(s) for s in steps], velocity_correction, start, configs)).encode())
+    h.update(repr(sorted((k, v) for k, v in vars(args).items() if k not in IGNORED_ARGS)).encode())
+    if len(args.param_file) > 0:
+        with open(args.param_file, 'rb') as f:
+            h.update(f.read())
+    for name in CODE_FILES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def load_result(cache_dir, key):
+    # The stored result of key, or None if it is not in the cache.
+    filename = os.path.join(cache_dir, key, 'result.yaml')
+    if not os.path.isfile(filename):
+        return None
+    with open(filename, 'rb') as f:
+        return yaml.load(f.read())
+
+def store_result(cache_dir, key, args, paths, objective, run_time, m=None):
+    # Stores the result of a run under key. m is the solved model, written out
+    # next to the result when the backend can.
+    entry = os.path.join(cache_dir, key)
+    os.makedirs(entry, exist_ok=True)
+    result = {'paths': [[[float(p[0]), float(p[1])] for p in path] for path in paths],
+              'objective': float(objective),
+              'run_time': float(run_time),
+              'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+              'args': {k: v for k, v in vars(args).items() if k not in ['sweep_starts', 'sweep_budgets', 'sweep_centers']}}
+    if m is not None:
+        for name in ['Status', 'MIPGap', 'ObjBound', 'NodeCount']:
+            try:
+                value = getattr(m, name)
+            except Exception:
+                continue
+            if value is not None:
+                result[name] = float(value)
+        if hasattr(m, 'write'):
+            m.write(os.path.join(entry, 'model.mps'))
+    with open(os.path.join(entry, 'result.yaml'), 'w') as f:
+        yaml.dump(result, f, default_flow_style=False)
+
+def list_cache(cache_dir):
+    for key in sorted(os.listdir(cache_dir)):
+        result = load_result(cache_dir, key)
+        if result is None:
+            continue
+        args = result['args']
+        print("%s  %s  robots %s start %s budget %s  objective %f  run time %f sec" % \
+              (key[:12], result['created'], args.get('robots'), args.get('start_point'), args.get('planning_time'), result['objective'], result['run_time']))
+
+def prune_cache(cache_dir, days=None):
+    removed = 0
+    for key in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, key)
+        if not os.path.isdir(entry):
+            continue
+        result = os.path.join(entry, 'result.yaml')
+        stamp = os.path.getmtime(result if os.path.isfile(result) else entry)
+        if days is None or time.time() - stamp > days*24*60*60:
+            shutil.rmtree(entry)
+            removed += 1
+    print("Removed %d cache entries." % removed)
+
+def main():
+    parser = argparse.ArgumentParser(description='List or prune the mip_test.py result cache')
+    parser.add_argument(
+        'command',
+        type=str,
+        choices=['list', 'prune'],
+        help='"list" prints the entries, "prune" deletes them.',
+        )
+    parser.add_argument(
+        '--cache_dir',
+        nargs='?',
+        type=str,
+        default='/home/mlfrantz/Documents/MIP_Research/mip_research/data/cache/',
+        help='Cache directory, the --cache_dir given to mip_test.py.',
+        )
+    parser.add_argument(
+        '--days',
+        nargs='?',
+        type=float,
+        default=None,
+        help='With prune, only deletes the entries older than this many days.',
+        )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cache_dir):
+        print("No cache in %s" % args.cache_dir)
+        sys.exit(1)
+    if args.command == 'list':
+        list_cache(args.cache_dir)
+    else:
+        prune_cache(args.cache_dir, args.days)
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,10 @@
 # This is a greedy one step lookahead for comparison to my MIP implementation
 
 import sys, pdb, time, argparse, os, csv
-import oyaml as yaml
 import numpy as np
 import matplotlib.pyplot as plt
 from sas_utils import World, Location
+from sweep import add_sweep_args, sweep_configs, load_yaml, load_saved_field
 
 def normalize(data, index=0):
     # This function scales the data between 0-1. the 'index' variable is to select
@@ -85,8 +85,120 @@ def corners(point,field):
         print("Failed, no solution.")
     return corners
 
-def main():
-
+def get_directions(direction_constr):
+    # Build the direction vectors for checking values
+    if direction_constr == '8_direction':
+        # Check each of the 8 directions (N,S,E,W,NE,NW,SE,SW)
+        directions = [(0,1), (0,-1), (1,0), (-1,0), (1,1), (-1,1), (1,-1), (-1,-1)]
+    elif direction_constr == 'nsew':
+        directions = [(0,1), (0,-1), (1,0), (-1,0)] # N-S-E-W
+    elif direction_constr == 'diag':
+        directions = [(1,1), (-1,1), (1,-1), (-1,-1)] # Diag
+    return directions
+
+def point_keys(points):
+    # Hashable keys of an (n,2) array of waypoints, the same point to 3 decimals
+    # gives the same key.
+    keys = np.rint(np.asarray(points, dtype=float)*1000).astype(np.int64)
+    return (keys[:,0]*(1 << 32) + keys[:,1]).tolist()
+
+def field_values(grid, points):
+    # Bilinear interpolation of a 2D field at an (n,2) array of points inside the
+    # grid, all in one go. Points on the grid get the value there. grid is indexed
+    # as it is, field[:,:,0] is a strided view and flattening it would copy it.
+    nx, ny = grid.shape
+    x0 = np.minimum(points[:,0].astype(int), nx - 2)
+    y0 = np.minimum(points[:,1].astype(int), ny - 2)
+    tx = points[:,0] - x0
+    ty = points[:,1] - y0
+    return (grid[x0,y0]*(1 - tx) + grid[x0 + 1,y0]*tx)*(1 - ty) + (grid[x0,y0 + 1]*(1 - tx) + grid[x0 + 1,y0 + 1]*tx)*ty
+
+def greedy_path(field, start, num_steps, vel, directions, same_point=True, visited=[]):
+    # Greedy one step look ahead for a single robot. Returns a path of num_steps
+    # waypoints [x,y] starting at start, moving vel cells in one of the directions
+    # each step. Also used by mip_test.py to warm start the MIP. visited are points
+    # from before start that count as already visited for same_point. The moves are
+    # scored on the first time step of the field, all directions at once, and the
+    # visited points are kept in a set so a step costs the same however long the
+    # path is.
+    grid = field[:,:,0] if field.ndim == 3 else field
+    moves = vel*np.array(directions, dtype=float)
+    path = [start]
+    seen = set(point_keys(list(visited) + path))
+    for s in range(1, num_steps):
+        candidates = np.array(path[-1], dtype=float) + moves
+        # Makes sure we are in
+        valid = (candidates[:,0] >= 0) & (candidates[:,0] <= grid.shape[0]-1) & \
+                (candidates[:,1] >= 0) & (candidates[:,1] <= grid.shape[1]-1)
+        if same_point:
+            valid &= np.array([k not in seen for k in point_keys(candidates)])
+        values = np.zeros(len(directions))
+        values[valid] = field_values(grid, candidates[valid])
+        d = directions[np.argmax(values)]
+        new_point = [path[-1][0] + vel*d[0], path[-1][1] + vel*d[1]]
+        path.append(new_point)
+        seen.update(point_keys([new_point]))
+    return path
+
+def separations(candidates, q, rad):
+    # Which of the four ways the MIP's collision constraint can keep a robot apart
+    # from one at q hold for each candidate point: x - q_x >= rad, q_x - x >= rad,
+    # y - q_y >= rad and q_y - y >= rad. A (4, n) boolean array.
+    tol = 1e-6
+    return np.array([candidates[:,0] - q[0] >= rad - tol, q[0] - candidates[:,0] >= rad - tol,
+                     candidates[:,1] - q[1] >= rad - tol, q[1] - candidates[:,1] >= rad - tol])
+
+def team_greedy_paths(field, start, num_steps, vels, directions, same_point=True, collision_rad=0):
+    # Greedy one step look ahead for a team of robots, one path per start. Each step
+    # the robots move in turn, each to its best move that no robot has been to yet
+    # (same_point) and that keeps it collision_rad apart from the robots before it.
+    # Like the MIP's collision constraint every pair has to stay apart the same way
+    # (one of the four in separations) for the whole mission, so each pair keeps the
+    # ways that held at every step so far. A robot boxed in by the others takes its
+    # best move on the map, the paths can then break the constraints. Also used by
+    # mip_test.py as a warm start for the team.
+    grid = field[:,:,0] if field.ndim == 3 else field
+    moves = [v*np.array(directions, dtype=float) for v in vels]
+    paths = [[p] for p in start]
+    seen = set(point_keys(start))
+    apart = {(r,q): np.ones(4, dtype=bool) for r in range(len(start)) for q in range(r)}
+    for s in range(1, num_steps):
+        for r, path in enumerate(paths):
+            candidates = np.array(path[-1], dtype=float) + moves[r]
+            # Makes sure we are in
+            inside = (candidates[:,0] >= 0) & (candidates[:,0] <= grid.shape[0]-1) & \
+                     (candidates[:,1] >= 0) & (candidates[:,1] <= grid.shape[1]-1)
+            valid = inside.copy()
+            if same_point:
+                valid &= np.array([k not in seen for k in point_keys(candidates)])
+            if collision_rad > 0:
+                for q in range(r):
+                    if apart[r,q].any():
+                        valid &= separations(candidates, paths[q][-1], collision_rad)[apart[r,q]].any(axis=0)
+                # Only moves that leave every robot after this one a move that keeps
+                # them apart, so it does not get boxed in.
+                for u in range(r + 1, len(paths)):
+                    if apart[u,r].any():
+                        after = np.array(paths[u][-1], dtype=float) + moves[u]
+                        after = after[(after[:,0] >= 0) & (after[:,0] <= grid.shape[0]-1) & \
+                                      (after[:,1] >= 0) & (after[:,1] <= grid.shape[1]-1)]
+                        valid &= np.array([separations(after, c, collision_rad)[apart[u,r]].any() for c in candidates])
+            if not valid.any():
+                # Boxed in by the others, at least stay on the map.
+                valid = inside
+            values = np.zeros(len(directions))
+            values[valid] = field_values(grid, candidates[valid])
+            d = directions[np.argmax(values)]
+            new_point = [path[-1][0] + vels[r]*d[0], path[-1][1] + vels[r]*d[1]]
+            path.append(new_point)
+            seen.update(point_keys([new_point]))
+            if collision_rad > 0:
+                for q in range(r):
+                    apart[r,q] &= separations(np.array([new_point], dtype=float), paths[q][-1], collision_rad)[:,0]
+    return paths
+
+def get_parser():
+    # The arguments of this script, also used by the planners built on it (beam.py).
     parser = argparse.ArgumentParser(description='Parser for MIP testing')
     parser.add_argument(
         '-i', '--infile_path',
@@ -170,6 +282,18 @@ def main():
         action='store_false',
         help='By default it will not allow a point to be visited twice in the same planning period.',
         )
+    parser.add_argument(
+        '--joint',
+        action='store_true',
+        help='Plans the robots together instead of one after the other. They move in turn each step, do not go where another robot has been (with --same_point) and keep --collision_rad apart the way the MIP does (each pair on the same side, along x or y, for the whole mission).',
+        )
+    parser.add_argument(
+        '-c', '--collision_rad',
+        nargs='?',
+        type=float,
+        default=0.0,
+        help='Collision Radius between robots. Only used with --joint.',
+        )
     parser.add_argument(
         '--gen_image',
         action='store_true',
@@ -188,7 +312,19 @@ def main():
         help='Name of the Experiement you are running',
         )
 
-    args = parser.parse_args()
+    add_sweep_args(parser)
+    return parser
+
+def main():
+    args = get_parser().parse_args()
+
+    for run_args in sweep_configs(args):
+        plan(run_args)
+
+def plan(args, path_planner=greedy_path, name='Greedy'):
+    # Plans for one configuration of the sweep, see sweep.py. path_planner plans the
+    # path of one robot and has the arguments of greedy_path, name is the algorithm
+    # in the CSV and picture names.
 
     # Path lenth in time (hours).
     Np = args.planning_time
@@ -198,14 +334,13 @@ def main():
         # ROMS map
         # Loading Simulation-Specific Parameters
 
-        with open(os.path.expandvars(args.sim_cfg),'rb') as f:
-            yaml_sim = yaml.load(f.read())
+        yaml_sim = load_yaml(args.sim_cfg, args.sim_center)
 
         fieldSavePath = '/home/mlfrantz/Documents/MIP_Research/mip_research/cfg/normal_field_{}_{}.npy'.format(str(abs(yaml_sim['sim_world']['center_longitude'])),yaml_sim['sim_world']['center_latitude'])
         
         try:
-            field = np.load(fieldSavePath)
-            norm_field = np.load(fieldSavePath)
+            field = load_saved_field(fieldSavePath)
+            norm_field = load_saved_field(fieldSavePath)
             print("Loaded Map Successfully")
         except IOError:
 
@@ -244,8 +379,7 @@ def main():
         mag_grad_field = np.sqrt(grad_field[0]**2 + grad_field[1]**2)
 
     # Load the robots.yaml Configuration file.
-    with open(os.path.expandvars(args.robots_cfg),'rb') as f:
-        yaml_mission = yaml.load(f.read())
+    yaml_mission = load_yaml(args.robots_cfg)
 
     # Get the speed of each robot that we are planning for.
     steps = []
@@ -294,56 +428,17 @@ def main():
         start = [start]
 
     # Greedy one step look ahead
-
-    # Build the direction vectors for checking values
-    if args.direction_constr == '8_direction':
-        # Check each of the 8 directions (N,S,E,W,NE,NW,SE,SW)
-        directions = [(0,1), (0,-1), (1,0), (-1,0), (1,1), (-1,1), (1,-1), (-1,-1)]
-    elif args.direction_constr == 'nsew':
-        directions = [(0,1), (0,-1), (1,0), (-1,0)] # N-S-E-W
-    elif args.direction_constr == 'diag':
-        directions = [(1,1), (-1,1), (1,-1), (-1,-1)] # Diag
+    directions = get_directions(args.direction_constr)
 
     startTime = time.time()
 
-
-    paths = []
-    for r in robots:
-        for s in steps[r]:
-            # Check each of the directions
-            if s == 0:
-                path = [start[r]]
-                continue
-            values = np.zeros(len(directions))
-
-            for i,d in enumerate(directions):
-                try:
-                    if args.same_point:
-                        move = [path[-1][0] + velocity_correction[r]*d[0], path[-1][1] + velocity_correction[r]*d[1]]
-                        if move[0] >= 0 and move[0] <= field.shape[0]-1 and move[1] >= 0 and move[1] <= field.shape[1]-1:
-                            # print(move,move[0], move[1],move[0] >= 0 and move[0] < field.shape[0] and move[1] >= 0 and move[1] < field.shape[1])
-                            # Makes sure we are in
-                            if [round(move[0],3),round(move[1],3)] not in [[round(p[0],3),round(p[1],3)] for p in path]:
-                                # print(move)
-                                values[i] = bilinear_interpolation(move, field)
-                                # values[i] = field[path[-1][0] + d[0], path[-1][1] + d[1], 0]
-                            else:
-                                continue
-                        else:
-                            # print(move[0], move[1],move[0] >= 0 and move[0] < field.shape[0] and move[1] >= 0 and move[1] < field.shape[1])
-                            # Makes sure we are in
-                            continue
-                    else:
-                        move = [path[-1][0] + velocity_correction[r]*d[0], path[-1][1] + velocity_correction[r]*d[1]]
-                        if move[0] >= 0 and move[0] <= field.shape[0]-1 and move[1] >= 0 and move[1] <= field.shape[1]-1:
-                            values[i] = bilinear_interpolation(move, field)
-                except:
-                    continue
-            # print(values)
-            new_point = [path[-1][0] + velocity_correction[r]*directions[np.argmax(values)][0], path[-1][1] + velocity_correction[r]*directions[np.argmax(values)][1]]
-            # print(new_point, values, np.argmax(values), directions[np.argmax(values)])
-            path.append(new_point)
-        paths.append(path)
+    if args.joint:
+        name += '_Joint'
+        paths = team_greedy_paths(field, start, len(steps[0]), velocity_correction, directions, args.same_point, args.collision_rad)
+    else:
+        paths = []
+        for r in robots:
+            paths.append(path_planner(field, start[r], len(steps[r]), velocity_correction[r], directions, args.same_point))
     # print(paths)
     runTime = time.time() - startTime
 
@@ -427,7 +522,7 @@ def main():
         except TypeError:
             score_str = '_no_solution'
 
-        file_string = 'greedy_' + time.strftime("%Y%m%d-%H%M%S") + \
+        file_string = name.lower() + '_' + time.strftime("%Y%m%d-%H%M%S") + \
                                                                     robots_str + \
                                                                     path_len_str + \
                                                                     end_point_str + \
@@ -451,7 +546,12 @@ def main():
         else:
             dir_str = ''
 
-        constraint_string = dir_str
+        if args.joint and args.collision_rad > 0:
+            collision_str = '_collRad_%d' % args.collision_rad
+        else:
+            collision_str = ''
+
+        constraint_string = collision_str + dir_str
 
         try:
             score_str = sum([bilinear_interpolation(p, field) for path in paths for p in path])
@@ -478,7 +578,7 @@ def main():
                 writer.writeheader()
 
             writer.writerow({   'Experiment': args.experiment_name, \
-                                'Algorithm': 'Greedy', \
+                                'Algorithm': name, \
                                 'Map': str(yaml_sim['roms_file']), \
                                 'Map Center': Location(xlon=yaml_sim['sim_world']['center_longitude'], ylat=yaml_sim['sim_world']['center_latitude']).__str__(), \
                                 'Map Resolution': (yaml_sim['sim_world']['resolution'],yaml_sim['sim_world']['resolution']), \
@@ -16,9 +16,9 @@ from scipy.spatial.distance import euclidean as dist
 import numpy as np
 
 import sys, pdb, time, argparse, os, csv
-import oyaml as yaml
 import matplotlib.pyplot as plt
 from sas_utils import World, Location
+from sweep import add_sweep_args, sweep_configs, load_yaml, load_saved_field
 
 def normalize(data, index=0):
 
@@ -224,6 +224,15 @@ class Node:
         self.childNodes.append(n)
         return n
 
+    def Prune(self, point):
+        """ Remove the moves onto point from this subtree, for when point has been added to the path.
+        """
+        key = [round(point[0],3),round(point[1],3)]
+        self.untriedMoves = [m for m in self.untriedMoves if [round(m[0],3),round(m[1],3)] != key]
+        self.childNodes = [c for c in self.childNodes if [round(c.move[0],3),round(c.move[1],3)] != key]
+        for c in self.childNodes:
+            c.Prune(point)
+
     def Update(self, result):
         """ Update this node - one additional visit and result additional wins. result must be from the viewpoint of playerJustmoved.
         """
@@ -251,14 +260,21 @@ class Node:
              s += str(c) + "\n"
         return s
 
-def UCT(rootstate, itermax, verbose = False):
-    """ Conduct a UCT search for itermax iterations starting from rootstate.
-        Return the best move from the rootstate.
+def UCT(rootstate, itermax, verbose = False, deadline = None, rootnode = None):
+    """ Conduct a UCT search starting from rootstate until the root has been visited itermax
+        times, or until the wall clock time deadline (time.time()) if one is given, whichever
+        comes first. rootnode is the tree kept from the last move, if any, whose visits count.
+        Return the best move from the rootstate, the number of iterations done and the tree.
         Assumes 2 alternating players (player 1 starts), with game results in the range [0.0, 1.0]."""
 
-    rootnode = Node(state = rootstate)
+    if rootnode is None:
+        rootnode = Node(state = rootstate)
 
-    for i in range(itermax):
+    iterations = 0
+    for i in range(max(itermax - rootnode.visits, 1)):
+        if deadline is not None and i > 0 and time.time() >= deadline:
+            break
+        iterations += 1
         node = rootnode
         state = rootstate.Clone() #creates a deep copy of the state
 
@@ -288,11 +304,15 @@ def UCT(rootstate, itermax, verbose = False):
     #else: print(rootnode.ChildrenToString())
 
     # return sorted(rootnode.childNodes, key = lambda c: c.wins)[-1].move # return the move that has the highest wins
-    return sorted(rootnode.childNodes, key = lambda c: c.visits)[-1].move # return the move that has the most visits
+    return sorted(rootnode.childNodes, key = lambda c: c.visits)[-1].move, iterations, rootnode # return the move that has the most visits
 
-def UCTPlayGame(field, start, budget, velocity_correction=1, end=None, direction_constr='8_direction',same_point=True):
+def UCTPlayGame(field, start, budget, velocity_correction=1, end=None, direction_constr='8_direction',same_point=True, time_limit=0, reuse=True):
     """ Play a sample game between two UCT players where each player gets a different number
         of UCT iterations (= simulations = tree nodes).
+        With a time_limit (seconds) for the whole path, each move gets an equal share of
+        the time that is left, so time saved on one move goes to the ones after it.
+        With reuse the subtree under the move played is the root of the next search, so
+        its visits do not have to be made again.
     """
 
     state = GameState(field, start, budget, start, velocity_correction, end, direction_constr, same_point)
@@ -300,9 +320,24 @@ def UCTPlayGame(field, start, budget, velocity_correction=1, end=None, direction
     # print(state.GetMoves())
     startTime = time.time()
     times_comp = [(0,0)]
+    total_iterations = 0
+    tree = None
     while (state.GetMoves() != []):
         # print(str(state))
-        m = UCT(rootstate = state, itermax = 1000000, verbose = False) # play with values for itermax and verbose = True
+        deadline = None
+        if time_limit > 0:
+            # The moves left are the steps left in the budget.
+            now = time.time()
+            deadline = now + max(startTime + time_limit - now, 0)/(state.budget - 1)
+        m, iterations, rootnode = UCT(rootstate = state, itermax = 1000000, verbose = False, deadline = deadline, rootnode = tree) # play with values for itermax and verbose = True
+        total_iterations += iterations
+        tree = None
+        if reuse:
+            tree = [c for c in rootnode.childNodes if c.move == m][0]
+            tree.parentNode = None
+            if same_point:
+                # m is on the path now, the subtree was grown before it was.
+                tree.Prune(m)
         # print("Best Move: " + str(m) + "\n")
         state.DoMove(m)
         state.path = state.path[:] + [m]
@@ -311,6 +346,8 @@ def UCTPlayGame(field, start, budget, velocity_correction=1, end=None, direction
         # print(str(state))
     print(return_path)
     print(times_comp)
+    run_time = time.time() - startTime
+    print("MCTS: %d iterations in %f sec, %f iterations/sec" % (total_iterations, run_time, total_iterations/max(run_time, 1e-9)))
 
     return return_path
 
@@ -383,7 +420,12 @@ def main():
         nargs='?',
         type=float,
         default=0.0,
-        help='Time limit in seconds you want to stop the simulation. Default lets it run until completion.',
+        help='Time limit in seconds for the whole plan, split evenly between the moves (what one move does not use goes to the next). Default runs 1000000 iterations per move.',
+        )
+    parser.add_argument(
+        '--fresh_tree',
+        action='store_true',
+        help='Starts the search for every move from an empty tree. By default the subtree under the move played is kept and searched on from.',
         )
     parser.add_argument(
         '-d', '--direction_constr',
@@ -399,6 +441,13 @@ def main():
         action='store_false',
         help='By default it will not allow a point to be visited twice in the same planning period.',
         )
+    parser.add_argument(
+        '--save_path',
+        nargs='?',
+        type=str,
+        default='',
+        help='Saves the planned paths to this .npy file, can be loaded by mip_test.py --warm_start.',
+        )
     parser.add_argument(
         '--gen_image',
         action='store_true',
@@ -417,8 +466,15 @@ def main():
         help='Name of the Experiement you are running',
         )
 
+    add_sweep_args(parser)
     args = parser.parse_args()
 
+    for run_args in sweep_configs(args):
+        plan(run_args)
+
+def plan(args):
+    # Plans for one configuration of the sweep, see sweep.py.
+
     # Path lenth in time (hours).
     Np = args.planning_time
 
@@ -427,14 +483,13 @@ def main():
         # ROMS map
         # Loading Simulation-Specific Parameters
 
-        with open(os.path.expandvars(args.sim_cfg),'rb') as f:
-            yaml_sim = yaml.load(f.read())
+        yaml_sim = load_yaml(args.sim_cfg, args.sim_center)
 
         fieldSavePath = '/home/mlfrantz/Documents/MIP_Research/mip_research/cfg/normal_field_{}_{}.npy'.format(str(abs(yaml_sim['sim_world']['center_longitude'])),yaml_sim['sim_world']['center_latitude'])
 
         try:
-            field = np.load(fieldSavePath)
-            norm_field = np.load(fieldSavePath)
+            field = load_saved_field(fieldSavePath)
+            norm_field = load_saved_field(fieldSavePath)
             print("Loaded Map Successfully")
         except IOError:
 
@@ -473,8 +528,7 @@ def main():
         mag_grad_field = np.sqrt(grad_field[0]**2 + grad_field[1]**2)
 
     # Load the robots.yaml Configuration file.
-    with open(os.path.expandvars(args.robots_cfg),'rb') as f:
-        yaml_mission = yaml.load(f.read())
+    yaml_mission = load_yaml(args.robots_cfg)
 
     # Get the speed of each robot that we are planning for.
     steps = []
@@ -526,10 +580,18 @@ def main():
 
     paths = []
     for r in robots:
-        paths.append(UCTPlayGame(field, [start[r]], len(steps[r]), velocity_correction[r], None, args.direction_constr, args.same_point))
+        # The time limit is for the whole plan, what is left is split between the
+        # robots still to plan for.
+        time_limit = 0
+        if args.time_limit > 0:
+            time_limit = max(args.time_limit - (time.time() - startTime), 0)/(len(robots) - r)
+        paths.append(UCTPlayGame(field, [start[r]], len(steps[r]), velocity_correction[r], None, args.direction_constr, args.same_point, time_limit, not args.fresh_tree))
 
     runTime = time.time() - startTime
 
+    if len(args.save_path) > 0:
+        np.save(args.save_path, np.array(paths, dtype=float))
+
     if args.gen_image:
         # # Plotting Code
         wd = World.roms(
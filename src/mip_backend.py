@@ -0,0 +1,477 @@
+"""
+Solver backends for the MIP planner.
+
+The model in mip_test.py is written against the gurobipy modelling API (addVars,
+addConstr(s), addSOS, quicksum, ...). This module lets the same formulation code run
+on an open-source solver too, so planning does not need a Gurobi license:
+
+    "gurobi"  gurobipy.Model, used as is.
+    "highs"   HighsModel below, a small model with the same API that solves with
+              HiGHS through scipy.optimize.milp (needs scipy >= 1.9).
+
+Use new_model() to get a model, and the GRB, quicksum, tuplelist and tupledict names
+from here instead of from gurobipy so the script still imports when gurobipy is not
+installed.
+"""
+
+import time
+import itertools
+import numpy as np
+import scipy.sparse as sparse
+
+try:
+    import gurobipy
+except ImportError:
+    gurobipy = None
+
+try:
+    from scipy.optimize import milp, LinearConstraint, Bounds
+except ImportError:
+    milp = None
+
+BACKENDS = ['gurobi', 'highs']
+
+class _GRB:
+    # The subset of gurobipy.GRB used by the planner, with the same values so both
+    # backends accept either set of constants.
+    CONTINUOUS = 'C'
+    BINARY = 'B'
+    INTEGER = 'I'
+    MINIMIZE = 1
+    MAXIMIZE = -1
+    SOS_TYPE1 = 1
+    SOS_TYPE2 = 2
+    INFINITY = 1e100
+    OPTIMAL = 2
+    INFEASIBLE = 3
+    UNBOUNDED = 5
+    CUTOFF = 6
+    TIME_LIMIT = 9
+
+if gurobipy is not None:
+    GRB = gurobipy.GRB
+    tuplelist = gurobipy.tuplelist
+    tupledict = gurobipy.tupledict
+else:
+    GRB = _GRB
+    tuplelist = list
+    tupledict = dict
+
+class BackendError(Exception):
+    pass
+
+def new_model(backend='gurobi'):
+    # Returns an empty model for the requested backend.
+    if backend == 'gurobi':
+        if gurobipy is None:
+            raise BackendError('gurobipy is not installed, try the "highs" backend.')
+        return gurobipy.Model()
+    elif backend == 'highs':
+        if milp is None:
+            raise BackendError('The "highs" backend needs scipy >= 1.9 (scipy.optimize.milp).')
+        return HighsModel()
+    raise BackendError('Unknown backend "%s", choose from %s.' % (backend, BACKENDS))
+
+def quicksum(terms):
+    # Sum of variables/expressions for either backend. gurobipy objects go to
+    # gurobipy.quicksum, everything else is accumulated in place in a LinExpr.
+    terms = iter(terms)
+    first = next(terms, None)
+    if first is None:
+        return LinExpr()
+    if gurobipy is not None and isinstance(first, (gurobipy.Var, gurobipy.LinExpr)):
+        return gurobipy.quicksum(itertools.chain([first], terms))
+    expr = LinExpr()
+    expr += first
+    for term in terms:
+        expr += term
+    return expr
+
+
+class LinExpr:
+    """ A linear expression, sum of coef*var plus a constant. Variables are stored by
+        their column index in the model.
+    """
+    __array_ufunc__ = None # Makes numpy scalars defer to our reflected operators
+
+    def __init__(self, coefs=None, const=0.0):
+        self.coefs = coefs if coefs is not None else {}
+        self.const = const
+
+    def copy(self):
+        return LinExpr(dict(self.coefs), self.const)
+
+    def _is_constant_with_gurobi(self, other):
+        # quicksum of an empty list gives a LinExpr of ours, which then has to mix
+        # with gurobipy expressions. It is just a constant then.
+        return gurobipy is not None and not self.coefs and isinstance(other, (gurobipy.Var, gurobipy.LinExpr))
+
+    def __iadd__(self, other):
+        if isinstance(other, Var):
+            self.coefs[other.index] = self.coefs.get(other.index, 0.0) + 1.0
+        elif isinstance(other, LinExpr):
+            for i, c in other.coefs.items():
+                self.coefs[i] = self.coefs.get(i, 0.0) + c
+            self.const += other.const
+        else:
+            self.const += float(other)
+        return self
+
+    def __isub__(self, other):
+        self += -1.0*other
+        return self
+
+    def __add__(self, other):
+        if self._is_constant_with_gurobi(other):
+            return self.const + other
+        expr = self.copy()
+        expr += other
+        return expr
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if self._is_constant_with_gurobi(other):
+            return self.const - other
+        expr = self.copy()
+        expr -= other
+        return expr
+
+    def __rsub__(self, other):
+        if self._is_constant_with_gurobi(other):
+            return other - self.const
+        return (-1.0*self) + other
+
+    def __mul__(self, other):
+        other = float(other)
+        return LinExpr({i: c*other for i, c in self.coefs.items()}, self.const*other)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return self*-1.0
+
+    def __le__(self, other):
+        if self._is_constant_with_gurobi(other):
+            return self.const <= other
+        return TempConstr(self - other, '<')
+
+    def __ge__(self, other):
+        if self._is_constant_with_gurobi(other):
+            return self.const >= other
+        return TempConstr(self - other, '>')
+
+    def __eq__(self, other):
+        if self._is_constant_with_gurobi(other):
+            return self.const == other
+        return TempConstr(self - other, '=')
+
+    __hash__ = object.__hash__
+
+    def getValue(self):
+        raise BackendError('Use model.ObjVal or getAttr("X", ...) with the highs backend.')
+
+
+class Var:
+    """ A single decision variable of a HighsModel."""
+    __array_ufunc__ = None
+
+    def __init__(self, model, index, name):
+        self.model = model
+        self.index = index
+        self.VarName = name
+        self.Start = None
+
+    def _expr(self):
+        return LinExpr({self.index: 1.0})
+
+    def __add__(self, other):
+        return self._expr() + other
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self._expr() - other
+
+    def __rsub__(self, other):
+        return other - self._expr()
+
+    def __mul__(self, other):
+        return self._expr()*other
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return self._expr()*-1.0
+
+    def __le__(self, other):
+        return self._expr() <= other
+
+    def __ge__(self, other):
+        return self._expr() >= other
+
+    def __eq__(self, other):
+        return self._expr() == other
+
+    __hash__ = object.__hash__
+
+    @property
+    def X(self):
+        return self.model._value(self.index)
+
+    @property
+    def LB(self):
+        return self.model._lb[self.index]
+
+    @LB.setter
+    def LB(self, value):
+        self.model._lb[self.index] = value
+
+    @property
+    def UB(self):
+        return self.model._ub[self.index]
+
+    @UB.setter
+    def UB(self, value):
+        self.model._ub[self.index] = value
+
+    def __repr__(self):
+        return '<Var %s>' % self.VarName
+
+
+class TempConstr:
+    """ A linear constraint 'expr sense 0' waiting to be added to a model."""
+    def __init__(self, expr, sense):
+        self.expr = expr
+        self.sense = sense
+
+
+class Constr:
+    """ A linear constraint row of a HighsModel. The right hand side can be changed
+        between solves like a Gurobi Constr.
+    """
+    def __init__(self, index, cols, vals, sense, rhs, name):
+        self.index = index
+        self.cols = cols
+        self.vals = vals
+        self.Sense = sense
+        self.RHS = rhs
+        self.ConstrName = name
+
+
+class Params:
+    # Solver parameters, names are case and underscore insensitive like in Gurobi.
+    def __init__(self):
+        object.__setattr__(self, '_values', {})
+
+    def __setattr__(self, key, value):
+        self._values[key.lower().replace('_', '')] = value
+
+    def __getattr__(self, key):
+        return self._values.get(key.lower().replace('_', ''))
+
+
+class HighsModel:
+    """ A mixed integer linear model with (a subset of) the gurobipy.Model API that is
+        solved with HiGHS through scipy.optimize.milp.
+
+        SOS2 sets are not supported by HiGHS so they are written out with one binary
+        per segment (lambda_i <= z_{i-1} + z_i, sum z <= 1) when the model is solved.
+    """
+    def __init__(self):
+        self.Params = Params()
+        self._vars = []
+        self._lb = []
+        self._ub = []
+        self._vtype = []
+        self._constrs = []
+        self._sos = []
+        self._obj = LinExpr()
+        self._sense = _GRB.MINIMIZE
+        self._x = None
+        self.Status = 1 # LOADED
+        self.Runtime = 0.0
+        self.ObjVal = None
+        self.ObjBound = None
+        self.MIPGap = None
+        self.SolCount = 0
+
+    def addVar(self, lb=0.0, ub=float('inf'), obj=0.0, vtype=_GRB.CONTINUOUS, name=''):
+        v = Var(self, len(self._vars), name)
+        self._vars.append(v)
+        self._lb.append(lb)
+        self._ub.append(ub if ub < _GRB.INFINITY else float('inf'))
+        self._vtype.append(vtype)
+        if obj != 0.0:
+            self._obj += obj*v
+        return v
+
+    def addVars(self, *indices, lb=0.0, ub=float('inf'), obj=0.0, vtype=_GRB.CONTINUOUS, name=''):
+        # Same indexing rules as gurobipy: an int n means range(n), and lists of
+        # tuples are flattened into the key.
+        index_lists = []
+        for index in indices:
+            if isinstance(index, (int, np.integer)):
+                index_lists.append(range(index))
+            else:
+                index_lists.append(index)
+        variables = {}
+        for key in itertools.product(*index_lists):
+            flat = []
+            for k in key:
+                if isinstance(k, tuple):
+                    flat.extend(k)
+                else:
+                    flat.append(k)
+            key = tuple(flat) if len(flat) > 1 else flat[0]
+            label = '%s[%s]' % (name, ','.join(str(k) for k in flat))
+            variables[key] = self.addVar(lb=lb, ub=ub, obj=obj, vtype=vtype, name=label)
+        return variables
+
+    def addConstr(self, constr, name=''):
+        if not isinstance(constr, TempConstr):
+            raise BackendError('addConstr expects a linear constraint, got %s' % type(constr))
+        expr = constr.expr
+        cols = np.fromiter(expr.coefs.keys(), dtype=int, count=len(expr.coefs))
+        vals = np.fromiter(expr.coefs.values(), dtype=float, count=len(expr.coefs))
+        c = Constr(len(self._constrs), cols, vals, constr.sense, -expr.const, name)
+        self._constrs.append(c)
+        return c
+
+    def addConstrs(self, constrs, name=''):
+        return [self.addConstr(c, name) for c in constrs]
+
+    def addSOS(self, sos_type, variables, weights=None):
+        self._sos.append((sos_type, list(variables)))
+
+    def remove(self, items):
+        # Removes constraints (or a list of them) from the model.
+        if not isinstance(items, (list, tuple)):
+            items = [items]
+        removed = set(id(c) for c in items)
+        self._constrs = [c for c in self._constrs if id(c) not in removed]
+        for i, c in enumerate(self._constrs):
+            c.index = i
+
+    def setObjective(self, expr, sense=_GRB.MINIMIZE):
+        self._obj = LinExpr() + expr
+        self._sense = sense
+
+    def getObjective(self):
+        return self._obj
+
+    def update(self):
+        pass
+
+    def reset(self, clearall=0):
+        # Discards the last solution, the next optimize starts from scratch.
+        self.Status = 1 # LOADED
+        self.Runtime = 0.0
+        self.ObjVal = None
+        self.ObjBound = None
+        self.MIPGap = None
+        self.SolCount = 0
+        self._x = None
+
+    def getVars(self):
+        return list(self._vars)
+
+    def getAttr(self, attr, items):
+        if isinstance(items, dict):
+            return {k: getattr(v, attr) for k, v in items.items()}
+        return [getattr(v, attr) for v in items]
+
+    def _value(self, index):
+        if self._x is None:
+            raise BackendError('Unable to retrieve attribute \'X\', no solution available.')
+        return self._x[index]
+
+    def _sos_rows(self, n_vars):
+        # Binary segment variables and rows for every SOS2 set (SOS1 uses one binary
+        # per member). Returns the extra bounds/integrality and the row triplets.
+        rows, cols, vals, lo, hi = [], [], [], [], []
+        n_extra = 0
+        row = len(self._constrs)
+        for sos_type, members in self._sos:
+            n = len(members)
+            if n <= 1:
+                continue
+            n_seg = n - 1 if sos_type == _GRB.SOS_TYPE2 else n
+            z = n_vars + n_extra + np.arange(n_seg)
+            n_extra += n_seg
+            for i, v in enumerate(members):
+                ub = self._ub[v.index]
+                if not np.isfinite(ub):
+                    raise BackendError('SOS members need a finite upper bound with the highs backend.')
+                # lambda_i - ub*(z_{i-1} + z_i) <= 0
+                if sos_type == _GRB.SOS_TYPE2:
+                    seg = [s for s in (i - 1, i) if 0 <= s < n_seg]
+                else:
+                    seg = [i]
+                rows += [row]*(1 + len(seg))
+                cols += [v.index] + [z[s] for s in seg]
+                vals += [1.0] + [-ub]*len(seg)
+                lo.append(-np.inf)
+                hi.append(0.0)
+                row += 1
+            rows += [row]*n_seg
+            cols += list(z)
+            vals += [1.0]*n_seg
+            lo.append(-np.inf)
+            hi.append(1.0)
+            row += 1
+        return n_extra, rows, cols, vals, lo, hi
+
+    def optimize(self):
+        start_time = time.time()
+        n = len(self._vars)
+        n_extra, s_rows, s_cols, s_vals, s_lo, s_hi = self._sos_rows(n)
+
+        c = np.zeros(n + n_extra)
+        for i, coef in self._obj.coefs.items():
+            c[i] += coef
+        if self._sense == _GRB.MAXIMIZE:
+            c = -c
+
+        integrality = np.zeros(n + n_extra)
+        lb = np.concatenate((np.array(self._lb, dtype=float), np.zeros(n_extra)))
+        ub = np.concatenate((np.array(self._ub, dtype=float), np.ones(n_extra)))
+        for i, vtype in enumerate(self._vtype):
+            if vtype in (_GRB.BINARY, _GRB.INTEGER):
+                integrality[i] = 1
+            if vtype == _GRB.BINARY:
+                lb[i] = max(lb[i], 0.0)
+                ub[i] = min(ub[i], 1.0)
+        integrality[n:] = 1
+
+        rows = [np.full(len(con.cols), con.index) for con in self._constrs] + [np.array(s_rows, dtype=int)]
+        cols = [con.cols for con in self._constrs] + [np.array(s_cols, dtype=int)]
+        vals = [con.vals for con in self._constrs] + [np.array(s_vals, dtype=float)]
+        lo = [con.RHS if con.Sense in ('>', '=') else -np.inf for con in self._constrs] + s_lo
+        hi = [con.RHS if con.Sense in ('<', '=') else np.inf for con in self._constrs] + s_hi
+        n_rows = len(self._constrs) + (max(s_rows) + 1 - len(self._constrs) if s_rows else 0)
+        A = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(n_rows, n + n_extra))
+
+        options = {'disp': self.Params.OutputFlag != 0}
+        if self.Params.TimeLimit:
+            options['time_limit'] = self.Params.TimeLimit
+        if self.Params.MIPGap is not None:
+            options['mip_rel_gap'] = self.Params.MIPGap
+
+        constraints = [LinearConstraint(A, lo, hi)] if n_rows > 0 else []
+        res = milp(c, integrality=integrality, bounds=Bounds(lb, ub), constraints=constraints, options=options)
+
+        self.Runtime = time.time() - start_time
+        self.Status = {0: _GRB.OPTIMAL, 1: _GRB.TIME_LIMIT, 2: _GRB.INFEASIBLE, 3: _GRB.UNBOUNDED}.get(res.status, 1)
+        self._x = res.x[:n].tolist() if res.x is not None else None
+        self.SolCount = 1 if res.x is not None else 0
+        sign = -1.0 if self._sense == _GRB.MAXIMIZE else 1.0
+        if res.x is not None:
+            self.ObjVal = sign*res.fun + self._obj.const
+            self.MIPGap = getattr(res, 'mip_gap', 0.0)
+        if getattr(res, 'mip_dual_bound', None) is not None:
+            self.ObjBound = sign*res.mip_dual_bound + self._obj.const
+        if res.status != 0:
+            # The HiGHS log (OutputFlag) already says how a solve went, only say why
+            # one stopped short.
+            print(res.message)
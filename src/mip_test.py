@@ -2,17 +2,22 @@
 
 """
 This is the main script for running the MIP code. You will have download the gurobi library by obtaining an academic account (https://pages.gurobi.com/registration).
+Without a Gurobi license the same model can be solved with HiGHS by passing "--backend highs", see mip_backend.py.
 
 The code is run from the command line. Please see the /scripts folder for examples.
 
 """
 
-import sys, pdb, time, argparse, os, csv
-import oyaml as yaml
+import sys, pdb, time, argparse, os, csv, copy
+import multiprocessing, queue
 import numpy as np
+import scipy.sparse as sparse
 import matplotlib.pyplot as plt
-from gurobipy import *
+from mip_backend import GRB, quicksum, tuplelist, tupledict, new_model, BACKENDS
+from greedy import get_directions, greedy_path, team_greedy_paths, point_keys
 from sas_utils import World, Location
+from sweep import add_sweep_args, sweep_configs, load_yaml, load_saved_field
+from cache import cache_key, load_result, store_result
 from math import sqrt
 
 def normalize(data, index=0):
@@ -94,9 +99,1466 @@ def corners(point, field, time=0):
         print("Failed, no solution.")
     return corners
 
+def reachable_box(start, step, vel, num_steps, size, end=None):
+    # Returns the (lower, upper) coordinate along one axis a robot can be at at a
+    # given step. A robot moves at most 'vel' cells per step, so after 'step' steps
+    # it is within step*vel of its start. If an end point is given it also has to be
+    # within (num_steps-1-step)*vel of the end to still make it there.
+    lower = start - vel*step
+    upper = start + vel*step
+    if end is not None:
+        lower = max(lower, end - vel*(num_steps - 1 - step))
+        upper = min(upper, end + vel*(num_steps - 1 - step))
+    return float(max(lower, 0)), float(min(upper, size - 1))
+
+def reachable_range(start, step, vel, num_steps, size, end=None):
+    # Returns the grid indices along one axis that a robot can be interpolated
+    # between at a given step, the cells around its reachable_box.
+    lower, upper = reachable_box(start, step, vel, num_steps, size, end)
+    lower = max(int(np.floor(lower + 1e-6)), 0)
+    upper = min(int(np.ceil(upper - 1e-6)), size - 1)
+    return np.arange(lower, upper + 1)
+
+def big_m(bounds, a, b, c, M):
+    # Smallest big-M for a row v[a] - v[b] >= c - M*z, given the (lower, upper) bounds
+    # of v. With z = 1 the row has to hold for any value of v[a] - v[b], the lowest
+    # being lower[a] - upper[b]. bounds is None without --tighten, then the constant
+    # M is kept.
+    if bounds is None:
+        return M
+    return float(max(c - (bounds[a][0] - bounds[b][1]), 0))
+
+def add_lambda_block_matrix(m, pairs, RX, RY, x, y, f, field_slices):
+    # Builds the interpolation (lambda) variables and all of their linking constraints
+    # with gurobipy's matrix interface. The coefficient matrix is put together with
+    # NumPy and handed to Gurobi in one call instead of one quicksum per constraint.
+    # Returns tupledicts with the same keys as the addVars version so the rest of the
+    # model does not care which one built them.
+    # Column order is [lxy | lx | ly | x | y | f], rows are grouped by (robot, step).
+    n_x = np.array([len(RX[k]) for k in pairs])
+    n_y = np.array([len(RY[k]) for k in pairs])
+    off_x = np.concatenate(([0], np.cumsum(n_x)))
+    off_y = np.concatenate(([0], np.cumsum(n_y)))
+    off_xy = np.concatenate(([0], np.cumsum(n_x*n_y)))
+
+    lx_m = m.addMVar(int(off_x[-1]), lb=0, ub=1, vtype=GRB.CONTINUOUS, name='lx')
+    ly_m = m.addMVar(int(off_y[-1]), lb=0, ub=1, vtype=GRB.CONTINUOUS, name='ly')
+    lxy_m = m.addMVar(int(off_xy[-1]), lb=0, vtype=GRB.CONTINUOUS, name='lxy')
+
+    col_lx = off_xy[-1]
+    col_ly = col_lx + off_x[-1]
+    col_x = col_ly + off_y[-1]
+    col_y = col_x + len(pairs)
+    col_f = col_y + len(pairs)
+
+    rows, cols, vals, rhs = [], [], [], []
+    row = 0
+    for k, (r,t) in enumerate(pairs):
+        a = n_x[k]
+        b = n_y[k]
+        ab = np.arange(a*b)
+        ones = np.ones(a*b)
+
+        # sum_j lxy[i,j] == lx[i] and sum_i lxy[i,j] == ly[j]
+        rows += [row + ab // b, np.arange(a) + row, row + a + ab % b, np.arange(b) + row + a]
+        cols += [off_xy[k] + ab, col_lx + off_x[k] + np.arange(a), off_xy[k] + ab, col_ly + off_y[k] + np.arange(b)]
+        vals += [ones, -np.ones(a), ones, -np.ones(b)]
+        row += a + b
+
+        # sum_i lx[i] == 1 and sum_j ly[j] == 1
+        rows += [np.full(a, row), np.full(b, row + 1)]
+        cols += [col_lx + off_x[k] + np.arange(a), col_ly + off_y[k] + np.arange(b)]
+        vals += [np.ones(a), np.ones(b)]
+
+        # sum_i DX[i]*lx[i] == x, sum_j DY[j]*ly[j] == y and the field value == f
+        coef = field_slices[t][np.ix_(RX[r,t], RY[r,t])].ravel()
+        rows += [np.full(a + 1, row + 2), np.full(b + 1, row + 3), np.full(a*b + 1, row + 4)]
+        cols += [np.append(col_lx + off_x[k] + np.arange(a), col_x + k),
+                 np.append(col_ly + off_y[k] + np.arange(b), col_y + k),
+                 np.append(off_xy[k] + ab, col_f + k)]
+        vals += [np.append(RX[r,t], -1), np.append(RY[r,t], -1), np.append(coef, -1)]
+
+        rhs += [np.zeros(a + b), [1, 1, 0, 0, 0]]
+        row += 5
+
+    A = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(row, col_f + len(pairs)))
+    all_vars = lxy_m.tolist() + lx_m.tolist() + ly_m.tolist() + \
+               [x[k] for k in pairs] + [y[k] for k in pairs] + [f[k] for k in pairs]
+    m.addMConstr(A, all_vars, '=', np.concatenate(rhs))
+
+    lx = tupledict(zip([(r,t,i) for r,t in pairs for i in RX[r,t]], lx_m.tolist()))
+    ly = tupledict(zip([(r,t,j) for r,t in pairs for j in RY[r,t]], ly_m.tolist()))
+    lxy = tupledict(zip([(r,t,i,j) for r,t in pairs for i in RX[r,t] for j in RY[r,t]], lxy_m.tolist()))
+    return lx, ly, lxy
+
+
+def add_flow_block(m, robots, steps, RX, RY, start, directions, x, y, f, field_slices):
+    # Time-expanded network formulation for robots that move whole grid cells each
+    # step. There is one binary per (robot, step, cell, direction) arc, flow is
+    # conserved at every cell and step, and the position and field value of each step
+    # are read off the arc entering it. Only cells in RX/RY are used.
+    # Returns the arcs and, per (robot, cell), the arcs entering that cell at any step.
+    keys = []
+    for r in robots:
+        for t in steps[r][:-1]:
+            if t == 0:
+                sources = [(start[r][0], start[r][1])]
+            else:
+                sources = [(i,j) for i in RX[r,t] for j in RY[r,t]]
+            next_x = set(RX[r,t+1])
+            next_y = set(RY[r,t+1])
+            for i,j in sources:
+                for k,d in enumerate(directions):
+                    if i + d[0] in next_x and j + d[1] in next_y:
+                        keys.append((r,t,i,j,k))
+    arcs = m.addVars(tuplelist(keys), vtype=GRB.BINARY, name='arc')
+
+    leaving = {}
+    entering = {}
+    for r,t,i,j,k in keys:
+        d = directions[k]
+        leaving.setdefault((r,t,i,j), []).append(arcs[r,t,i,j,k])
+        entering.setdefault((r,t+1,i+d[0],j+d[1]), []).append(arcs[r,t,i,j,k])
+
+    visits = {}
+    for r in robots:
+        m.addConstr(quicksum(leaving.get((r,0,start[r][0],start[r][1]), [])) == 1, name='Flow start[%d]' % r)
+        for t in steps[r][1:]:
+            cells = [(i,j) for i in RX[r,t] for j in RY[r,t] if (r,t,i,j) in entering or (r,t,i,j) in leaving]
+            if t < steps[r][-1]:
+                for i,j in cells:
+                    m.addConstr(quicksum(entering.get((r,t,i,j), [])) == quicksum(leaving.get((r,t,i,j), [])))
+            into = [(i, j, a) for i,j in cells for a in entering.get((r,t,i,j), [])]
+            m.addConstr(quicksum(i*a for i,j,a in into) == x[r,t])
+            m.addConstr(quicksum(j*a for i,j,a in into) == y[r,t])
+            m.addConstr(quicksum(field_slices[t][i,j]*a for i,j,a in into) == f[r,t])
+            for i,j,a in into:
+                visits.setdefault((r,i,j), []).append(a)
+    return arcs, visits
+
+def set_flow_start(paths, arcs, directions, values=None):
+    # Loads paths as a MIP start for the network flow formulation. Given a values
+    # dict the start is put in there instead, as {variable: value}.
+    start = {a: 0 for a in arcs.values()}
+    for r, path in enumerate(paths):
+        for t in range(len(path) - 1):
+            d = (int(round(path[t+1][0] - path[t][0])), int(round(path[t+1][1] - path[t][1])))
+            key = (r, t, int(round(path[t][0])), int(round(path[t][1])), directions.index(d) if d in directions else -1)
+            if key in arcs:
+                start[arcs[key]] = 1
+    apply_start(start, values)
+
+def apply_start(start, values=None):
+    # Sets the Start attribute of every variable in the start dict, or copies the
+    # dict into values when the start is wanted for a callback.
+    if values is not None:
+        values.update(start)
+    else:
+        for v, value in start.items():
+            v.Start = value
+
+def interpolation_weights(p):
+    # SOS2 weights of the (at most two) neighbouring grid points of coordinate p.
+    i = int(np.floor(p + 1e-6))
+    w = p - i
+    if w < 1e-6:
+        return {i: 1.0}
+    return {i: 1.0 - w, i + 1: w}
+
+def set_mip_start(paths, x, y, b, lx, ly, lxy, f, field_slices, values=None):
+    # Loads paths (one list of [x,y] waypoints per robot) as a MIP start. Every
+    # position, motion and interpolation variable is set so the solver gets a
+    # complete incumbent at t=0, the binaries of the optional constraints are left
+    # for the solver to fill in. Given a values dict the start is put in there instead.
+    start = {}
+    for var_dict in [lx, ly, lxy]:
+        for v in var_dict.values():
+            start[v] = 0.0
+    for r, path in enumerate(paths):
+        for t, point in enumerate(path):
+            if (r,t) not in x:
+                # Path is longer than the planning horizon.
+                break
+            start[x[r,t]] = point[0]
+            start[y[r,t]] = point[1]
+            wx = interpolation_weights(point[0])
+            wy = interpolation_weights(point[1])
+            for i, w in wx.items():
+                if (r,t,i) in lx:
+                    start[lx[r,t,i]] = w
+            for j, w in wy.items():
+                if (r,t,j) in ly:
+                    start[ly[r,t,j]] = w
+            value = 0.0
+            for i, w_i in wx.items():
+                for j, w_j in wy.items():
+                    if (r,t,i,j) in lxy:
+                        start[lxy[r,t,i,j]] = w_i*w_j
+                        value += field_slices[t][i,j]*w_i*w_j
+            start[f[r,t]] = value
+            if t > 0:
+                dx = point[0] - path[t-1][0]
+                dy = point[1] - path[t-1][1]
+                start[b[r,t,0]] = 1 if dx > 1e-6 else 0
+                start[b[r,t,1]] = 1 if dx < -1e-6 else 0
+                start[b[r,t,2]] = 1 if dy > 1e-6 else 0
+                start[b[r,t,3]] = 1 if dy < -1e-6 else 0
+            else:
+                for k in range(4):
+                    start[b[r,t,k]] = 0
+    apply_start(start, values)
+
+
+def lazy_violated(key, x_val, y_val, steps, collision_rad):
+    # Checks if a solution breaks a lazily held constraint group.
+    # ('same_point', r, t, s): robot r is at the same point at steps t and s.
+    # ('collision', r, s): no single direction keeps robots r and s collision_rad apart
+    # at every step, which is what the shared t2[r,s,:] binaries ask for.
+    tol = 1e-6
+    if key[0] == 'same_point':
+        _, r, t, s = key
+        return abs(x_val[r,t] - x_val[r,s]) < 0.1 - tol and abs(y_val[r,t] - y_val[r,s]) < 0.1 - tol
+    elif key[0] == 'collision':
+        _, r, s = key
+        times = steps[s][1:]
+        separated = [all(x_val[r,t] - x_val[s,t] >= collision_rad - tol for t in times),
+                     all(x_val[s,t] - x_val[r,t] >= collision_rad - tol for t in times),
+                     all(y_val[r,t] - y_val[s,t] >= collision_rad - tol for t in times),
+                     all(y_val[s,t] - y_val[r,t] >= collision_rad - tol for t in times)]
+        return not any(separated)
+    return False
+
+def add_trace_row(trace, run_time, incumbent, bound):
+    # One row of the solve progress, only added when the incumbent or bound moved.
+    # The incumbent is None until the first solution is found.
+    if len(trace) > 0 and trace[-1][1] == incumbent and abs(trace[-1][2] - bound) < 1e-9:
+        return
+    gap = abs(bound - incumbent)/abs(incumbent) if incumbent not in (None, 0) else None
+    trace.append((run_time, incumbent, bound, gap))
+
+def mip_callback(model, where):
+    # Gurobi callback. Every new incumbent is checked against the lazy constraint
+    # groups and the violated ones are added with cbLazy. Gurobi does not promise to
+    # keep lazy constraints added earlier, so all groups are checked every time.
+    # With a trace the incumbents that are kept and the bound are logged over time.
+    if model._shared is not None and where in (GRB.Callback.MIPSOL, GRB.Callback.MIPNODE):
+        share_incumbent(model, where)
+    if where == GRB.Callback.MIPSOL:
+        rejected = False
+        if len(model._lazy) > 0:
+            x_val = model.cbGetSolution(model._x)
+            y_val = model.cbGetSolution(model._y)
+            for key, rows in model._lazy.items():
+                if lazy_violated(key, x_val, y_val, model._steps, model._collision_rad):
+                    rejected = True
+                    for row in rows:
+                        model.cbLazy(row)
+        if model._trace is not None and not rejected:
+            incumbent = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+            if len(model._trace) > 0 and model._trace[-1][1] is not None:
+                incumbent = max(incumbent, model._trace[-1][1])
+            add_trace_row(model._trace, model.cbGet(GRB.Callback.RUNTIME), incumbent, model.cbGet(GRB.Callback.MIPSOL_OBJBND))
+    elif where == GRB.Callback.MIP and model._trace is not None:
+        incumbent = model._trace[-1][1] if len(model._trace) > 0 else None
+        add_trace_row(model._trace, model.cbGet(GRB.Callback.RUNTIME), incumbent, model.cbGet(GRB.Callback.MIP_OBJBND))
+
+def optimize_lazy_rounds(m, lazy, x, y, steps, collision_rad, time_limit=0, trace=None):
+    # For backends without lazy constraint callbacks. Solve, add the groups the
+    # solution violates as normal constraints and solve again until nothing is violated.
+    total_time = 0.0
+    while True:
+        if time_limit > 0:
+            m.Params.TIME_LIMIT = max(time_limit - total_time, 1.0)
+        m.optimize()
+        total_time += m.Runtime
+        if m.SolCount == 0:
+            break
+        x_val = m.getAttr('X', x)
+        y_val = m.getAttr('X', y)
+        violated = [key for key in lazy if lazy_violated(key, x_val, y_val, steps, collision_rad)]
+        if trace is not None:
+            # A solution that breaks a held back group only gives a bound.
+            add_trace_row(trace, total_time, m.ObjVal if len(violated) == 0 else None, m.ObjBound if m.ObjBound is not None else m.ObjVal)
+        if len(violated) == 0:
+            break
+        if time_limit > 0 and total_time >= time_limit:
+            print("Time limit reached with %d lazy constraint groups still violated." % len(violated))
+            break
+        for key in violated:
+            for row in lazy.pop(key):
+                m.addConstr(row)
+        print("Added %d violated lazy constraint groups, solving again." % len(violated))
+    m.Runtime = total_time
+
+
+def coefficient_tensor(field, arrival_times, snapshot_hours=1):
+    # The field at each arrival time (hours) as a (T,X,Y) array. The field has a
+    # snapshot every snapshot_hours along its last axis, times in between get the
+    # linear interpolation of the two snapshots around them and times past the last
+    # snapshot get the last one.
+    s = np.clip(np.asarray(arrival_times, dtype=float)/snapshot_hours, 0, field.shape[2] - 1)
+    lower = np.floor(s).astype(int)
+    upper = np.minimum(lower + 1, field.shape[2] - 1)
+    w = (s - lower)[:, None, None]
+    snapshots = np.moveaxis(field, 2, 0)
+    return (1 - w)*snapshots[lower] + w*snapshots[upper]
+
+def field_value(field_slice, point):
+    # Bilinear value of a 2D field at a (possibly fractional) point, the same value
+    # the lambda weights give f in the model.
+    value = 0.0
+    for i, w_i in interpolation_weights(point[0]).items():
+        for j, w_j in interpolation_weights(point[1]).items():
+            value += field_slice[i,j]*w_i*w_j
+    return value
+
+def warm_start(model_vars, args, field, steps, velocity_correction, start, field_slices):
+    # Warm start from a heuristic path so the solver has an incumbent from the beginning.
+    if len(args.warm_start) > 0:
+        if args.backend != 'gurobi':
+            print("MIP starts are only used by the gurobi backend, ignoring --warm_start.")
+        else:
+            if args.warm_start == 'greedy':
+                directions = get_directions(args.direction_constr)
+                start_paths = [greedy_path(field, start[r], len(steps[r]), velocity_correction[r], directions, args.same_point) for r in range(len(steps))]
+            elif args.warm_start == 'team':
+                directions = get_directions(args.direction_constr)
+                start_paths = team_greedy_paths(field, start, len(steps[0]), velocity_correction, directions, args.same_point, args.collision_rad)
+                revisits = args.same_point and any(len(set(point_keys(path))) < len(path) for path in start_paths)
+                if revisits or (args.collision_rad > 0 and paths_collide(start_paths, steps, args.collision_rad)):
+                    # A robot got boxed in, the start would just be thrown away.
+                    print("The team greedy paths break the same point or collision constraints, not using them as a MIP start.")
+                    return
+            else:
+                start_paths = np.load(args.warm_start).tolist()
+            load_start(model_vars, args, start_paths, field_slices)
+
+def extend_start(args, field, steps, velocity_correction, previous):
+    # Extends the paths of the previous (shorter budget) plan to the steps of this one
+    # with greedy steps from where each of them ended.
+    directions = get_directions(args.direction_constr)
+    paths = []
+    for r, path in enumerate(previous):
+        path = [list(p) for p in path]
+        extra = len(steps[r]) - len(path)
+        if extra > 0:
+            path += greedy_path(field, path[-1], extra + 1, velocity_correction[r], directions, args.same_point, path[:-1])[1:]
+        paths.append(path[:len(steps[r])])
+    return paths
+
+def multi_start(args, yaml_sim, field, steps, velocity_correction, field_slices, time_field, configs):
+    # Plans from every start in --multi_start in this one process. Only the right hand
+    # sides of the start constraints depend on the start, so the model is built once
+    # and re-optimized in place for each of them. Writes a CSV row per start. Plain
+    # solves only, main() rejects the other modes. With --cache_dir every start is
+    # looked up (and stored) on its own, under the key of a single run from it.
+    n = 2*len(steps)
+    starts = [args.multi_start[i:i + n] for i in range(0, len(args.multi_start), n)]
+    rebuild = args.reachable or args.tighten or args.formulation == 'flow' or args.symmetry
+    if rebuild:
+        print("--reachable, --tighten, --symmetry and the flow formulation are built around the start point, rebuilding the model for every start.")
+    m = None
+    for start_point in starts:
+        start = [start_point[i:i + 2] for i in range(0, n, 2)]
+        run_args = copy.copy(args)
+        run_args.start_point = start_point
+        run_args.multi_start = []
+        if len(args.cache_dir) > 0:
+            key = cache_key(run_args, field_slices, steps, velocity_correction, start, configs)
+            cached = None if args.force_solve else load_result(args.cache_dir, key)
+            if cached is not None:
+                paths = [[tuple(p) for p in path] for path in cached['paths']]
+                print("Cached result %s from %s, objective %f" % (key[:12], cached['created'], cached['objective']))
+                print(start_point, paths)
+                write_csv_row(run_args, yaml_sim, start_point, paths, cached['objective'], cached['run_time'], time_field)
+                continue
+        if m is None or rebuild:
+            m, model_vars = build_model(args, steps, velocity_correction, start, field_slices, args.end_point, configs)
+        else:
+            m.reset()
+            for r in range(len(steps)):
+                model_vars['init_x'][r].RHS = start[r][0]
+                model_vars['init_y'][r].RHS = start[r][1]
+                model_vars['init_f'][r].RHS = field_value(field_slices[0], start[r])
+        warm_start(model_vars, args, field, steps, velocity_correction, start, field_slices)
+        trace = solve_model(m, model_vars, args, steps)
+        if m.SolCount == 0:
+            print("No solution from start %s." % start_point)
+            continue
+        paths = get_paths(m, model_vars, steps)
+        print(start_point, paths)
+        if len(args.cache_dir) > 0:
+            store_result(args.cache_dir, key, run_args, paths, m.ObjVal, m.Runtime, m)
+        write_csv_row(run_args, yaml_sim, start_point, paths, m.ObjVal, m.Runtime, time_field, save_trace(args, trace, start_point))
+
+def solve_subproblem(task):
+    # One robot of the decomposition, run in a worker process. Grid points are priced
+    # with mu[t,i,j] and the ones in forbidden can not be used at all. Returns the
+    # path, the bound on the priced objective and the lxy weights of the solution.
+    args, steps, velocity_correction, start, field_slices, config, mu, forbidden = task
+    m, model_vars = build_model(args, [steps], [velocity_correction], [start], field_slices, args.end_point, [config])
+    m.Params.OutputFlag = 0
+    f = model_vars['f']
+    lxy = model_vars['lxy']
+    for t,i,j in forbidden:
+        if (0,t,i,j) in lxy:
+            lxy[0,t,i,j].UB = 0
+    if len(mu) > 0:
+        price = quicksum(w*lxy[0,t,i,j] for (t,i,j), w in mu.items() if (0,t,i,j) in lxy)
+        m.setObjective(quicksum(f.values()) - price, GRB.MAXIMIZE)
+    solve_model(m, model_vars, args, [steps])
+    if m.SolCount == 0:
+        return None, None, {}
+    path = get_paths(m, model_vars, [steps])[0]
+    weights = {key[1:]: w for key, w in m.getAttr('X', lxy).items() if w > 1e-6 and key[1] > 0}
+    bound = m.ObjBound if m.ObjBound is not None else m.ObjVal
+    return path, bound, weights
+
+def repair_paths(tasks, results, last):
+    # Makes the subproblem paths share no grid point at any step. Robots keep their
+    # path in order, one that runs into a point taken by an earlier robot is planned
+    # again without the taken points and without prices.
+    occupied = set()
+    paths = []
+    for task, (path, bound, weights) in zip(tasks, results):
+        cells = set(key for key in weights if key[0] != last)
+        if len(cells & occupied) > 0:
+            path, bound, weights = solve_subproblem(task[:6] + ({}, occupied))
+            if path is None:
+                return None
+            cells = set(key for key in weights if key[0] != last)
+        occupied |= cells
+        paths.append(path)
+    return paths
+
+def paths_collide(paths, steps, collision_rad):
+    # Checks a plan against the collision constraints of build_model, the same test
+    # the lazy constraints use.
+    x_val = {(r,t): p[0] for r, path in enumerate(paths) for t, p in enumerate(path)}
+    y_val = {(r,t): p[1] for r, path in enumerate(paths) for t, p in enumerate(path)}
+    return any(lazy_violated(('collision', r, s), x_val, y_val, steps, collision_rad) for r in range(1, len(paths)) for s in range(r))
+
+def decompose(args, steps, velocity_correction, start, field_slices, configs):
+    # Plans each robot on its own in parallel worker processes. The robots are coupled
+    # by "at most one robot on a grid point at each step" (the start, and the end if
+    # there is one, are left out), which is relaxed with Lagrange multipliers updated
+    # by subgradient steps. Each round also repairs the paths into a conflict free
+    # plan. Returns the best plan, its objective, the Lagrangian bound and the wall
+    # time. The bound is on the relaxed problem with only the grid point coupling, not
+    # on the full model with --collision_rad and the same point constraints, and with
+    # --collision_rad (at most one grid cell, see main()) a plan that breaks it is
+    # not taken. With --time_limit each iteration splits the time left over the
+    # batches of subproblems the workers run one after the other plus a repair solve
+    # per robot, so the run stays within the limit.
+    robots = range(len(steps))
+    sub_args = copy.copy(args)
+    sub_args.collision_rad = 0
+    sub_args.threads = args.threads if args.threads > 0 else 1
+    if sub_args.formulation != 'sos2':
+        print("The decomposition prices the interpolation weights, using the sos2 formulation.")
+        sub_args.formulation = 'sos2'
+    last = len(steps[0]) - 1 if len(args.end_point) > 0 else None
+    workers = args.workers if args.workers > 0 else min(len(robots), multiprocessing.cpu_count())
+
+    dec_start = time.time()
+    mu = {}
+    best_paths = None
+    best_obj = -np.inf
+    dual = np.inf
+    theta = 2.0
+    stall = 0
+    # Spawned workers, a forked Gurobi environment is not safe to use.
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        for k in range(args.decompose_iters):
+            if args.time_limit > 0:
+                left = args.time_limit - (time.time() - dec_start)
+                slots = int(np.ceil(len(robots)/workers)) + len(robots)
+                sub_args = copy.copy(sub_args)
+                sub_args.time_limit = max(left/slots, 0.1)
+            tasks = [(sub_args, steps[r], velocity_correction[r], start[r], field_slices, configs[r], mu, set()) for r in robots]
+            results = pool.map(solve_subproblem, tasks)
+            if any(path is None for path, bound, weights in results):
+                print("A robot has no feasible path on its own, stopping the decomposition.")
+                break
+
+            value = sum([bound for path, bound, weights in results]) + sum(mu.values())
+            if value < dual - 1e-9:
+                dual = value
+                stall = 0
+            else:
+                stall += 1
+                if stall >= 3:
+                    theta /= 2
+                    stall = 0
+
+            usage = {}
+            for path, bound, weights in results:
+                for key, w in weights.items():
+                    if key[0] != last:
+                        usage[key] = usage.get(key, 0.0) + w
+            if any(u > 1 + 1e-6 for u in usage.values()):
+                paths = repair_paths(tasks, results, last)
+            else:
+                paths = [path for path, bound, weights in results]
+            if paths is not None and args.collision_rad > 0 and paths_collide(paths, steps, args.collision_rad):
+                print("The plan of iteration %d breaks --collision_rad, not taken." % k)
+                paths = None
+            if paths is not None:
+                objective = sum([field_value(field_slices[t], p) for path in paths for t,p in enumerate(path)])
+                if objective > best_obj:
+                    best_obj = objective
+                    best_paths = paths
+
+            gap = (dual - best_obj)/abs(best_obj) if best_obj not in (0, -np.inf) else np.inf
+            print("Decomposition iteration %d: relaxation bound %f, best objective %f, gap to it %.2f%%" % (k, dual, best_obj, 100*gap))
+            if gap <= 1e-4 or (args.time_limit > 0 and time.time() - dec_start >= args.time_limit):
+                break
+
+            # Subgradient step on the multipliers (Polyak step size).
+            g = {key: usage.get(key, 0.0) - 1 for key in set(usage) | set(mu)}
+            norm = sum([v**2 for v in g.values()])
+            if norm == 0 or best_obj == -np.inf:
+                break
+            step = theta*(value - best_obj)/norm
+            mu = {key: mu.get(key, 0.0) + step*v for key, v in g.items() if mu.get(key, 0.0) + step*v > 1e-9}
+
+    run_time = time.time() - dec_start
+    return best_paths, best_obj, dual, run_time
+
+# Members of --portfolio: the changes to the arguments and the gurobi parameters each
+# one solves the plan with. Gurobi parameters are skipped by the other backends.
+PORTFOLIO = {
+    'default':     ({}, {}),
+    'feasibility': ({}, {'MIPFocus': 1, 'Heuristics': 0.5}),
+    'bound':       ({}, {'MIPFocus': 2, 'Cuts': 2}),
+    'occupancy':   ({'revisit_encoding': 'occupancy'}, {}),
+    'flow':        ({'formulation': 'flow'}, {}),
+    'highs':       ({'backend': 'highs'}, {}),
+}
+
+def share_incumbent(model, where):
+    # Portfolio part of mip_callback. New incumbents are published to the other
+    # members, and a better incumbent published by another member is handed to
+    # this solve (checked at most every half second).
+    name, shared, lock, events, port_start = model._shared
+    if where == GRB.Callback.MIPSOL:
+        objective = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+        x_val = model.cbGetSolution(model._x)
+        y_val = model.cbGetSolution(model._y)
+        paths = [[(x_val[r,t], y_val[r,t]) for t in model._steps[r]] for r in range(len(model._steps))]
+        with lock:
+            if objective > shared['objective'] + 1e-6:
+                shared.update({'objective': objective, 'paths': paths, 'member': name})
+                events.append((name, time.time() - port_start, 'incumbent', objective))
+    elif where == GRB.Callback.MIPNODE and time.time() >= model._next_share:
+        model._next_share = time.time() + 0.5
+        if model.cbGet(GRB.Callback.MIPNODE_STATUS) != GRB.OPTIMAL:
+            return
+        objective = shared['objective']
+        if shared['member'] not in (None, name) and objective > model.cbGet(GRB.Callback.MIPNODE_OBJBST) + 1e-6 and objective > model._received + 1e-6:
+            model._received = objective
+            values = {}
+            load_start(model._vars, model._args, shared['paths'], model._field_slices, values)
+            model.cbSetSolution(list(values.keys()), list(values.values()))
+            model.cbUseSolution()
+            events.append((name, time.time() - port_start, 'received from %s' % shared['member'], objective))
+
+def portfolio_member(name, args, steps, velocity_correction, start, field_slices, configs, shared, lock, events, results, port_start):
+    # One member of the portfolio, run in its own process. Solves the plan with the
+    # member's settings and puts the outcome on the results queue.
+    overrides, params = PORTFOLIO[name]
+    args = copy.copy(args)
+    for key, value in overrides.items():
+        setattr(args, key, value)
+    if args.formulation == 'flow' and min(velocity_correction) < 1:
+        results.put({'member': name, 'error': 'the flow formulation needs all robots to move whole grid cells'})
+        return
+    try:
+        m, model_vars = build_model(args, steps, velocity_correction, start, field_slices, args.end_point, configs)
+        m.Params.OutputFlag = 0
+        m.Params.MIPGap = args.target_gap
+        if args.backend == 'gurobi':
+            for key, value in params.items():
+                setattr(m.Params, key, value)
+            m._vars = model_vars
+            m._args = args
+            m._field_slices = field_slices
+            m._next_share = 0
+            m._received = -np.inf
+        solve_model(m, model_vars, args, steps, (name, shared, lock, events, port_start))
+        if m.SolCount == 0:
+            results.put({'member': name, 'objective': None, 'bound': m.ObjBound, 'time': time.time() - port_start})
+            return
+        objective = m.ObjVal
+        with lock:
+            if objective > shared['objective'] + 1e-6:
+                shared.update({'objective': objective, 'paths': get_paths(m, model_vars, steps), 'member': name})
+                events.append((name, time.time() - port_start, 'incumbent', objective))
+        # Optimal is within MIPGap, which is --target_gap.
+        results.put({'member': name, 'objective': objective, 'bound': m.ObjBound, 'time': time.time() - port_start,
+                     'reached_gap': m.Status == GRB.OPTIMAL})
+    except Exception as e:
+        results.put({'member': name, 'error': str(e)})
+
+def portfolio(args, steps, velocity_correction, start, field_slices, configs):
+    # Solves the plan with several solver settings at once, one process each. Gurobi
+    # members share their incumbents. Returns as soon as one member gets to
+    # --target_gap, all of them have stopped or the --time_limit deadline has passed,
+    # with the best plan any member found, its objective and the wall time. What
+    # every member did is printed at the end.
+    names = args.portfolio if len(args.portfolio) > 0 else list(PORTFOLIO)
+    ctx = multiprocessing.get_context('spawn')
+    manager = ctx.Manager()
+    shared = manager.dict({'objective': -np.inf, 'paths': None, 'member': None})
+    lock = manager.Lock()
+    events = manager.list()
+    results = ctx.Queue()
+
+    port_start = time.time()
+    procs = [ctx.Process(target=portfolio_member, args=(name, args, steps, velocity_correction, start, field_slices, configs, shared, lock, events, results, port_start)) for name in names]
+    for p in procs:
+        p.start()
+
+    finished = {}
+    winner = None
+    while len(finished) < len(procs):
+        try:
+            # A little past the deadline, members stop on their own time limit.
+            result = results.get(timeout=max(0, args.time_limit + 30 - (time.time() - port_start)) if args.time_limit > 0 else None)
+        except queue.Empty:
+            break
+        finished[result['member']] = result
+        if result.get('reached_gap', False):
+            # The others stopped on their time limit or without a plan, the best
+            # plan found so far is kept in shared either way.
+            winner = result['member']
+            break
+    run_time = time.time() - port_start
+    for p in procs:
+        if p.is_alive():
+            p.terminate()
+        p.join()
+
+    events = list(events)
+    best_paths = shared['paths']
+    best_objective = shared['objective']
+    manager.shutdown()
+    for name in names:
+        found = [e for e in events if e[0] == name and e[2] == 'incumbent']
+        received = [e for e in events if e[0] == name and e[2].startswith('received')]
+        result = finished.get(name, {})
+        if 'error' in result:
+            status = 'failed (%s)' % result['error']
+        elif name in finished:
+            status = 'finished after %.2f sec, objective %s' % (result['time'], result['objective'])
+        else:
+            status = 'stopped'
+        print("Portfolio member %s: %s, %d best incumbents found, %d received%s" % (name, status, len(found), len(received), ', winner' if name == winner else ''))
+    for name, t, event, objective in sorted(events, key=lambda e: e[1]):
+        print("    %8.3f sec  %-12s %-24s %f" % (t, name, event, objective))
+
+    if best_paths is None:
+        return None, None, run_time
+    return best_paths, best_objective, run_time
+
+def exclude_points(m, model_vars, args, steps, velocity_correction, visited):
+    # Keeps robot r off the points in visited[r] after the first step of the model,
+    # the points earlier receding horizon windows already went through. A robot on
+    # the integer grid gets the lambda weights (or flow arcs) of those cells fixed to
+    # 0, the others the pairwise same point constraints against each point.
+    x = model_vars['x']
+    y = model_vars['y']
+    M = 100
+    for r in range(len(steps)):
+        points = visited[r]
+        on_grid = velocity_correction[r] == 1 and np.allclose(np.round(points), points, atol=1e-6)
+        cells = set((int(np.round(p[0])), int(np.round(p[1]))) for p in points)
+        if on_grid and args.formulation == 'flow':
+            directions = get_directions(args.direction_constr)
+            for (q,t,i,j,k), a in model_vars['arcs'].items():
+                if q == r and (i + directions[k][0], j + directions[k][1]) in cells:
+                    a.UB = 0
+        elif on_grid:
+            for (q,t,i,j), w in model_vars['lxy'].items():
+                if q == r and t > 0 and (i,j) in cells:
+                    w.UB = 0
+        else:
+            for t in steps[r][1:]:
+                for p in points:
+                    z = m.addVars(range(4), vtype=GRB.BINARY)
+                    m.addConstr(x[r,t] - p[0] >= 0.1 - M*z[0])
+                    m.addConstr(p[0] - x[r,t] >= 0.1 - M*z[1])
+                    m.addConstr(y[r,t] - p[1] >= 0.1 - M*z[2])
+                    m.addConstr(p[1] - y[r,t] >= 0.1 - M*z[3])
+                    m.addConstr(z[0] + z[1] + z[2] + z[3] <= 3)
+
+def receding_horizon(args, field, steps, velocity_correction, start, field_slices, window, commit, configs=None):
+    # Plans a long mission window steps at a time. Each window is solved from where
+    # the robots are, the first commit steps are kept and the next window starts
+    # there, warm started with the rest of the previous window's plan. Returns the
+    # paths, the objective of the whole mission and the total wall time.
+    robots = range(len(steps))
+    num_steps = len(steps[0])
+    directions = get_directions(args.direction_constr)
+    end_point = args.end_point
+    paths = [[tuple(start[r])] for r in robots]
+    tail = None
+    pos = 0
+    rh_start = time.time()
+    while pos < num_steps - 1:
+        moves = min(window, num_steps - 1 - pos)
+        last = pos + moves == num_steps - 1
+        w_steps = [range(moves + 1) for r in robots]
+        w_start = [list(path[-1]) for path in paths]
+        w_slices = field_slices[pos:pos + moves + 1]
+        m, model_vars = build_model(args, w_steps, velocity_correction, w_start, w_slices, end_point if last else [], configs)
+        if args.same_point and pos > 0:
+            # The no revisit rule holds over the whole mission, not just the window.
+            exclude_points(m, model_vars, args, w_steps, velocity_correction, [path[:-1] for path in paths])
+
+        if len(end_point) > 0 and not last:
+            # Only the last window gets the end constraint, the ones before it have to
+            # stop somewhere the end point can still be reached from.
+            left = num_steps - 1 - pos - moves
+            x = model_vars['x']
+            y = model_vars['y']
+            for r in robots:
+                reach = velocity_correction[r]*left
+                m.addConstr(x[r,moves] - end_point[0] <= reach)
+                m.addConstr(end_point[0] - x[r,moves] <= reach)
+                m.addConstr(y[r,moves] - end_point[1] <= reach)
+                m.addConstr(end_point[1] - y[r,moves] <= reach)
+
+        if tail is not None and args.backend == 'gurobi':
+            # The uncommitted part of the last plan, filled out with greedy steps.
+            start_paths = []
+            for r in robots:
+                path = [list(p) for p in tail[r][:moves + 1]]
+                if len(path) < moves + 1:
+                    path += greedy_path(field, path[-1], moves + 2 - len(path), velocity_correction[r], directions, args.same_point, paths[r][:-1] + path[:-1])[1:]
+                start_paths.append(path)
+            load_start(model_vars, args, start_paths, w_slices)
+
+        solve_model(m, model_vars, args, w_steps)
+        if m.SolCount == 0:
+            print("No solution for the window starting at step %d, stopping here." % pos)
+            break
+
+        w_paths = get_paths(m, model_vars, w_steps)
+        keep = moves if last else min(commit, moves)
+        for r in robots:
+            paths[r] += w_paths[r][1:keep + 1]
+        tail = [w_paths[r][keep:] for r in robots]
+        print("Window at step %d: kept %d of %d steps, window objective %f" % (pos, keep, moves, m.ObjVal))
+        pos += keep
+
+    run_time = time.time() - rh_start
+    objective = sum([field_value(field_slices[t], p) for path in paths for t,p in enumerate(path)])
+    return paths, objective, run_time
+
+def coarse_to_fine(args, steps, velocity_correction, start, field_slices, configs=None):
+    # Plans on the field downsampled by --coarse first, where the lambda block is
+    # --coarse^2 times smaller and a step covers --coarse cells. The coarse path,
+    # moved to start at the real start point, is the MIP start of the full resolution
+    # model, which only gets the cells within --corridor of it. Returns the full
+    # resolution model and variables, its trace and the total solve time.
+    k = args.coarse
+    robots = range(len(steps))
+    size_x, size_y = field_slices.shape[1:3]
+    c_steps = [range(int(np.ceil((len(steps[r]) - 1)/k)) + 1) for r in robots]
+    c_times = np.minimum(np.arange(len(c_steps[0]))*k, field_slices.shape[0] - 1)
+    c_slices = field_slices[c_times][:, ::k, ::k]
+    c_start = [[min(int(np.round(p[0]/k)), c_slices.shape[1] - 1), min(int(np.round(p[1]/k)), c_slices.shape[2] - 1)] for p in start]
+
+    # The constraints given in grid cells are scaled to the coarse grid.
+    c_args = copy.copy(args)
+    c_args.warm_start = ''
+    c_args.trace_dir = ''
+    c_args.collision_rad = args.collision_rad/k
+    if len(args.rect_area) > 0:
+        area = args.rect_area
+        c_args.rect_area = [int(np.floor(area[0]/k)), int(np.ceil(area[1]/k)), int(np.floor(area[2]/k)), int(np.ceil(area[3]/k))]
+    c_end = [int(np.round(e/k)) for e in args.end_point]
+
+    print("Coarse model: %d x %d grid, %d steps." % (c_slices.shape[1], c_slices.shape[2], len(c_steps[0])))
+    m, model_vars = build_model(c_args, c_steps, velocity_correction, c_start, c_slices, c_end, configs)
+    solve_model(m, model_vars, c_args, c_steps)
+    coarse_time = m.Runtime
+
+    corridor = None
+    if m.SolCount > 0:
+        # Fine step t is a fraction t/k of the way along the coarse path.
+        c_paths = get_paths(m, model_vars, c_steps)
+        start_paths = []
+        corridor = {}
+        for r in robots:
+            c_path = np.array(c_paths[r])
+            along = np.arange(len(steps[r]))/k
+            fine_x = np.clip(start[r][0] + k*(np.interp(along, np.arange(len(c_path)), c_path[:,0]) - c_path[0,0]), 0, size_x - 1)
+            fine_y = np.clip(start[r][1] + k*(np.interp(along, np.arange(len(c_path)), c_path[:,1]) - c_path[0,1]), 0, size_y - 1)
+            start_paths.append([[px, py] for px, py in zip(fine_x, fine_y)])
+            for t in steps[r]:
+                w = 0 if t == 0 else args.corridor
+                corridor[r,t] = (max(fine_x[t] - w, 0), min(fine_x[t] + w, size_x - 1), max(fine_y[t] - w, 0), min(fine_y[t] + w, size_y - 1))
+    else:
+        print("No coarse solution, planning on the whole grid.")
+
+    m, model_vars = build_model(args, steps, velocity_correction, start, field_slices, args.end_point, configs, corridor)
+    if corridor is not None and args.backend == 'gurobi':
+        load_start(model_vars, args, start_paths, field_slices)
+    trace = solve_model(m, model_vars, args, steps)
+    if corridor is not None and m.SolCount == 0 and m.Status != GRB.TIME_LIMIT:
+        print("No solution within the corridor, planning on the whole grid.")
+        coarse_time += m.Runtime
+        m, model_vars = build_model(args, steps, velocity_correction, start, field_slices, args.end_point, configs)
+        trace = solve_model(m, model_vars, args, steps)
+    return m, model_vars, trace, coarse_time + m.Runtime
+
+def write_csv_row(args, yaml_sim, start_point, paths, objective, run_time, time_field, trace_file=''):
+    # Appends the result of one plan to the CSV file at --outfile_path.
+    filename = args.outfile_path
+    check_empty = os.path.exists(filename)
+
+    if args.direction_constr == 'nsew':
+        dir_str = '_%s' % args.direction_constr
+    elif args.direction_constr == 'diag':
+        dir_str = '_%s' % args.direction_constr
+    else:
+        dir_str = ''
+
+    if args.collision_rad > 0:
+        collision_str = '_collRad_%d' % args.collision_rad
+    else:
+        collision_str = ''
+
+    if args.anti_curl:
+        anti_curl_str = '_antiCurl'
+    else:
+        anti_curl_str = ''
+
+    if args.force_curl:
+        force_curl_str = '_forceCurl'
+    else:
+        force_curl_str = ''
+
+    if len(args.straight_line) > 0:
+        straight_line_str = '_straight_%d_%d' % (args.straight_line[0], args.straight_line[1])
+    else:
+        straight_line_str = ''
+
+    if len(args.rect_area) > 0:
+        area = args.rect_area
+        rect_area_str = '_rect_x%d_%dy%d_%d' % (area[0], area[1], area[2], area[3])
+    else:
+        rect_area_str = ''
+
+    if len(args.sync) > 0:
+        sync_str = 'sync'
+    else:
+        sync_str =''
+
+    constraint_string = collision_str + \
+                        dir_str + anti_curl_str + \
+                        force_curl_str + \
+                        straight_line_str + \
+                        rect_area_str + \
+                        sync_str
+
+    if args.time_vary:
+        score_str = objective
+        alg_str = "MIP_Time_Vary"
+    else:
+        score_str = sum([field_value(time_field[t], p) for path in paths for t,p in enumerate(path)])
+        alg_str = "MIP"
+    if args.horizon > 0:
+        alg_str += '_RH'
+    if args.decompose:
+        alg_str += '_Decomp'
+    if args.coarse > 1:
+        alg_str += '_C2F'
+    if args.portfolio is not None:
+        alg_str += '_Portfolio'
+    if args.backend != 'gurobi':
+        alg_str += '_' + args.backend
+    # obj = m.getObjective()
+    # score_str = obj.getValue()
+
+    with open(filename, 'a', newline='') as csvfile:
+        fieldnames = [  'Experiment', \
+                        'Algorithm', \
+                        'Map', \
+                        'Map Center', \
+                        'Map Resolution', \
+                        'Start Point', \
+                        'End Point', \
+                        'Score', \
+                        'Run Time (sec)', \
+                        'Budget (hours)', \
+                        'Number of Robots', \
+                        'Constraints', \
+                        'Trace File']
+        if check_empty:
+            # Rows have to match the header already in the file, which may be from
+            # before the Trace File column.
+            with open(filename, newline='') as f:
+                header = next(csv.reader(f), [])
+            if len(header) > 0:
+                if len(trace_file) > 0 and 'Trace File' not in header:
+                    print("%s has no Trace File column, the trace file is not recorded in it." % filename)
+                fieldnames = header
+            else:
+                check_empty = False
+
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+        if not check_empty:
+            print("File is empty")
+            writer.writeheader()
+
+        row = {   'Experiment': args.experiment_name, \
+                            'Algorithm': alg_str, \
+                            'Map': str(yaml_sim['roms_file']), \
+                            'Map Center': Location(xlon=yaml_sim['sim_world']['center_longitude'], ylat=yaml_sim['sim_world']['center_latitude']).__str__(), \
+                            'Map Resolution': (yaml_sim['sim_world']['resolution'],yaml_sim['sim_world']['resolution']), \
+                            'Start Point': start_point, \
+                            'End Point': args.end_point if len(args.end_point) > 0 else 'NA' , \
+                            'Score': score_str, \
+                            'Run Time (sec)': run_time, \
+                            'Budget (hours)': args.planning_time, \
+                            'Number of Robots': len(args.robots), \
+                            'Constraints': constraint_string, \
+                            'Trace File': trace_file}
+        writer.writerow(row)
+
+def symmetry_groups(configs, start):
+    # Groups of robots (more than one) with the same robots.yaml config, apart from
+    # the plotting color, and the same start point.
+    groups = {}
+    for r, (config, point) in enumerate(zip(configs, start)):
+        key = (str(sorted((k, v) for k, v in config.items() if k != 'color')), tuple(point))
+        groups.setdefault(key, []).append(r)
+    return [group for group in groups.values() if len(group) > 1]
+
+def tighten_bounds(args, steps, velocity_correction, start, end_point, field_slices, x, y, f):
+    # Sets the bounds of x, y and f of every (robot, step) to what the robot can reach
+    # at that step and returns the (lower, upper) bounds of x and y.
+    XB = {}
+    YB = {}
+    end = end_point if len(end_point) > 0 else [None, None]
+    size_x, size_y = field_slices[0].shape[:2]
+    for r in range(len(steps)):
+        for t in steps[r]:
+            XB[r,t] = reachable_box(start[r][0], t, velocity_correction[r], len(steps[r]), size_x, end[0])
+            YB[r,t] = reachable_box(start[r][1], t, velocity_correction[r], len(steps[r]), size_y, end[1])
+            if len(args.rect_area) > 0 and t > 0:
+                area = args.rect_area
+                XB[r,t] = (max(XB[r,t][0], area[0]), min(XB[r,t][1], area[1]))
+                YB[r,t] = (max(YB[r,t][0], area[2]), min(YB[r,t][1], area[3]))
+            x[r,t].LB, x[r,t].UB = XB[r,t]
+            y[r,t].LB, y[r,t].UB = YB[r,t]
+            cells = field_slices[t][int(np.floor(XB[r,t][0] + 1e-6)):int(np.ceil(XB[r,t][1] - 1e-6)) + 1,
+                                    int(np.floor(YB[r,t][0] + 1e-6)):int(np.ceil(YB[r,t][1] - 1e-6)) + 1]
+            if cells.size > 0:
+                f[r,t].LB = float(np.min(cells))
+                f[r,t].UB = float(np.max(cells))
+    return XB, YB
+
+def build_model(args, steps, velocity_correction, start, field_slices, end_point=[], configs=None, corridor=None):
+    # Builds the path planning MIP for the robots starting at start (one [x,y] per
+    # robot). field_slices holds the field each step is scored on, so a window later
+    # in the mission just passes a later part of the list. Returns the model and a
+    # dict of its variables, plus the held back constraint groups under 'lazy'.
+    # configs are the robots.yaml entries of the robots, used by --symmetry.
+    # corridor keeps each (robot, step) in a (x_lo, x_hi, y_lo, y_hi) box, see
+    # coarse_to_fine.
+    robots = range(len(steps))
+
+    DX = np.arange(field_slices[0].shape[0]) # Integer values for range of X coordinates
+    DY = np.arange(field_slices[0].shape[1]) # Integer values for range of Y coordinates
+
+    build_start = time.time()
+    m = new_model(args.backend) # This defines a model inside Gurobi (or HiGHS).
+    if args.time_limit > 0:
+        # Sets a runtime limit. Default is to run to completion.
+        m.Params.TIME_LIMIT = args.time_limit
+    if args.threads > 0:
+        m.Params.Threads = args.threads
+    # m.Params.MIPGap = 0.01 # Allows the model to run until the solution is within a certain range of the optimal.
+
+    # Add variables
+    pairs = tuplelist([(r,s) for r in robots for s in steps[r]])
+
+    x = m.addVars(pairs, lb=DX[0], ub=DX[-1], vtype=GRB.CONTINUOUS, name='x')
+    y = m.addVars(pairs, lb=DY[0], ub=DY[-1], vtype=GRB.CONTINUOUS, name='y')
+
+    f = m.addVars(pairs, lb=np.min(field_slices), ub=np.max(field_slices), vtype=GRB.CONTINUOUS, name='f')
+
+    # With --tighten every position is bounded by the box the robot can reach at that
+    # step (from its start, end point and --rect_area), the field value by the field
+    # over that box, and the big-M constants below are derived from these bounds.
+    XB = YB = None
+    if args.tighten:
+        XB, YB = tighten_bounds(args, steps, velocity_correction, start, end_point, field_slices, x, y, f)
+
+    # Grid indices each robot is interpolated over at each step. By default this is
+    # the whole grid, with --reachable it is only the cells the robot can get to.
+    RX = {}
+    RY = {}
+    for r,t in pairs:
+        if args.reachable:
+            end = end_point if len(end_point) > 0 else [None, None]
+            RX[r,t] = reachable_range(start[r][0], t, velocity_correction[r], len(steps[r]), len(DX), end[0])
+            RY[r,t] = reachable_range(start[r][1], t, velocity_correction[r], len(steps[r]), len(DY), end[1])
+            if len(args.rect_area) > 0 and t > 0:
+                area = args.rect_area
+                RX[r,t] = RX[r,t][(RX[r,t] >= np.floor(area[0])) & (RX[r,t] <= np.ceil(area[1]))]
+                RY[r,t] = RY[r,t][(RY[r,t] >= np.floor(area[2])) & (RY[r,t] <= np.ceil(area[3]))]
+        else:
+            RX[r,t] = DX
+            RY[r,t] = DY
+
+    if corridor is not None:
+        for r,t in pairs:
+            x_lo, x_hi, y_lo, y_hi = corridor[r,t]
+            if XB is not None:
+                x_lo, x_hi = max(XB[r,t][0], x_lo), min(XB[r,t][1], x_hi)
+                y_lo, y_hi = max(YB[r,t][0], y_lo), min(YB[r,t][1], y_hi)
+                XB[r,t] = (x_lo, x_hi)
+                YB[r,t] = (y_lo, y_hi)
+            RX[r,t] = RX[r,t][(RX[r,t] >= np.floor(x_lo + 1e-6)) & (RX[r,t] <= np.ceil(x_hi - 1e-6))]
+            RY[r,t] = RY[r,t][(RY[r,t] >= np.floor(y_lo + 1e-6)) & (RY[r,t] <= np.ceil(y_hi - 1e-6))]
+            x[r,t].LB, x[r,t].UB = float(x_lo), float(x_hi)
+            y[r,t].LB, y[r,t].UB = float(y_lo), float(y_hi)
+
+    b = lx = ly = lxy = arcs = None
+    if args.formulation == 'flow':
+        arcs, visits = add_flow_block(m, robots, steps, RX, RY, start, get_directions(args.direction_constr), x, y, f, field_slices)
+    elif args.matrix_build:
+        lx, ly, lxy = add_lambda_block_matrix(m, pairs, RX, RY, x, y, f, field_slices)
+    else:
+        lx = m.addVars(tuplelist([(r,t,i) for r,t in pairs for i in RX[r,t]]), lb=0, ub=1, vtype=GRB.CONTINUOUS, name='lx')
+        ly = m.addVars(tuplelist([(r,t,j) for r,t in pairs for j in RY[r,t]]), lb=0, ub=1, vtype=GRB.CONTINUOUS, name='ly')
+        lxy = m.addVars(tuplelist([(r,t,i,j) for r,t in pairs for i in RX[r,t] for j in RY[r,t]]), vtype=GRB.CONTINUOUS, name='lxy')
+
+    if args.formulation == 'sos2':
+        for r in robots:
+            for t in steps[r]:
+                m.addSOS(GRB.SOS_TYPE2, [lx[r,t,i] for i in RX[r,t]])
+                m.addSOS(GRB.SOS_TYPE2, [ly[r,t,j] for j in RY[r,t]])
+
+    budget = m.addVars(pairs, lb=0, ub=len(steps[0]), vtype=GRB.CONTINUOUS, name="budget")
+    m.addConstrs((budget[r, steps[r][0]] == len(steps[0]) for r in robots), name="Initial Budget")
+
+    # Add main constraints
+
+    # Kept so another start can be planned for by changing their right hand sides.
+    init_x = m.addConstrs((x[r, steps[r][0]] == start[r][0] for r in robots), name="Initial x")
+    init_y = m.addConstrs((y[r, steps[r][0]] == start[r][1] for r in robots), name="Initial y")
+
+    init_f = m.addConstrs((f[r, steps[r][0]] == field_value(field_slices[0], start[r]) for r in robots), name="Initial f")
+
+    # Optional end position constraint. Could implement additional position constaint
+    if len(end_point) > 0 :
+        end = end_point
+        m.addConstrs((x[r, steps[r][-1]] == end[0] for r in robots), name="End x")
+        m.addConstrs((y[r, steps[r][-1]] == end[1] for r in robots), name="End y")
+        # m.addConstr((f[r, steps[r][-1]] == field[end[0], end[1], -1] for r in robots), name="End f")
+
+    # The matrix and flow builds already added these linking constraints.
+    if args.formulation == 'sos2' and not args.matrix_build:
+        for r in robots:
+            for t in steps[r]:
+                m.addConstrs(quicksum(lxy[r, t, i, j] for j in RY[r,t]) == lx[r, t, i] for i in RX[r,t])
+                m.addConstrs(quicksum(lxy[r, t, i, j] for i in RX[r,t]) == ly[r, t, j] for j in RY[r,t])
+
+        m.addConstrs((quicksum(lx[r, t, i] for i in RX[r,t]) == 1 for r in robots for t in steps[r]))
+        m.addConstrs((quicksum(ly[r, t, j] for j in RY[r,t]) == 1 for r in robots for t in steps[r]))
+
+        m.addConstrs((quicksum(DX[i]*lx[r,t,i] for i in RX[r,t]) == x[r,t] for r in robots for t in steps[r]))
+        m.addConstrs((quicksum(DY[j]*ly[r,t,j] for j in RY[r,t]) == y[r,t] for r in robots for t in steps[r]))
+
+        m.addConstrs((quicksum(field_slices[t][i,j]*lxy[r,t,i,j] for i in RX[r,t] for j in RY[r,t]) == f[r,t] for r in robots for t in steps[r]))
+
+    # Primary Motion constraints
+
+    # There is something to this but it doesnt work as is
+    #
+    # if len(args.straight_line) > 0:
+    #     # Now we need to correct our previous velocity_correction by making sure the edges are the lengths of the edges are all equal.
+    #     path_len_x = args.straight_line[0]
+    #     path_len_y = args.straight_line[1]
+    #
+    #     # if path_len_x > 1 or path_len_y > 1:
+    #     #     print(steps)
+    #     #     pdb.set_trace()
+    #     #     for r in robots:
+    #     #         steps = [s for s in steps[r]]
+    #
+    # else:
+    path_len_x = 1
+    path_len_y = 1
+
+    # for r in robots:
+    #     v = velocity_correction[r]
+    #     m.addQConstr( (quicksum( (((x[r,t-1]-x[r,t])*(x[r,t-1]-x[r,t])) + \
+    #                   ((y[r,t-1]-y[r,t])*(y[r,t-1]-y[r,t]))) for t in steps[r][1:])) <= (len(steps[r]))  ) # -1 becuase we added a step above
+
+    # m.addConstrs(( quicksum( ((x[r,t-1]-x[r,t])*(x[r,t-1]-x[r,t])) + ((y[r,t-1]-y[r,t])*(y[r,t-1]-y[r,t])) )  <= len(steps[r]) for r in robots for t in steps[r][1:] ))
+
+    # Binary variables for motion constraints. The flow formulation moves along its
+    # arcs instead, which only exist in the allowed directions.
+    if args.formulation == 'sos2':
+        b_range = range(4)
+        b = m.addVars(pairs, b_range, vtype=GRB.BINARY, name='b%d' % t)
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                # pdb.set_trace()
+                m.addConstr(x[r,t-1] + v*path_len_x*b[r,t,0] - v*path_len_x*b[r,t,1] == x[r,t])
+                m.addConstr(b[r,t,0] + b[r,t,1] <= 1)
+                m.addConstr(y[r,t-1] + v*path_len_y*b[r,t,2] - v*path_len_y*b[r,t,3] == y[r,t])
+                m.addConstr(b[r,t,2] + b[r,t,3] <= 1)
+                # m.addConstr(budget[r,t-1] - (b[r,t,0] + b[r,t,1] + b[r,t,2] + b[r,t,3])  == budget[r,t])
+
+        # Direction constraints PCA/Eignevector/Cardinal constraints
+        if args.direction_constr == '8_direction':
+            m.addConstrs(b[r,t,0] + b[r,t,1] + b[r,t,2] + b[r,t,3] >= 1 for r in robots for t in steps[r][1:])
+        elif args.direction_constr == 'nsew':
+            m.addConstrs(b[r,t,0] + b[r,t,1] + b[r,t,2] + b[r,t,3] == 1 for r in robots for t in steps[r][1:]) #PCA N-S-E-W
+        elif args.direction_constr == 'diag':
+            m.addConstrs(b[r,t,0] + b[r,t,1] + b[r,t,2] + b[r,t,3] == 2 for r in robots for t in steps[r][1:]) #PCA Diag
+
+    # Add option constraints
+
+    # Symmetry breaking. Identical robots leaving from the same point can swap paths
+    # without changing the plan, so their positions after the first step are put
+    # in order (x first, then y) and the solver only has to look at one of the swaps.
+    if args.symmetry and configs is not None and len(steps[0]) > 1:
+        for group in symmetry_groups(configs, start):
+            for r, s in zip(group[:-1], group[1:]):
+                m.addConstr(len(DY)*x[r,1] + y[r,1] <= len(DY)*x[s,1] + y[s,1], name='Symmetry[%d,%d]' % (r,s))
+
+    # With --lazy the same point and collision constraint groups are kept out of the
+    # model, keyed by what they protect, and only added once a solution violates them.
+    lazy = {}
+
+    # Constraint to prevent going through the same point twice
+    if args.same_point and args.formulation == 'flow':
+        # Each cell can be entered at most once, the start cell never again.
+        for (r,i,j), cell_arcs in visits.items():
+            m.addConstr(quicksum(cell_arcs) <= (0 if [i,j] == list(start[r]) else 1), name='Visits[%d,%d,%d]' % (r,i,j))
+    elif args.same_point:
+        M = 100
+        for r in robots:
+            if args.revisit_encoding == 'occupancy':
+                if velocity_correction[r] == 1:
+                    # On the integer grid the lambda weights are one-hot at the visited
+                    # cell, so capping the visits of every cell at 1 forbids revisits
+                    # with O(T) nonzeros per cell instead of O(T^2) big-M pairs.
+                    visits = {}
+                    for t in steps[r]:
+                        for i in RX[r,t]:
+                            for j in RY[r,t]:
+                                visits.setdefault((i,j), []).append(lxy[r,t,i,j])
+                    for cell, cell_vars in visits.items():
+                        if len(cell_vars) > 1:
+                            m.addConstr(quicksum(cell_vars) <= 1, name='Visits[%d,%d,%d]' % (r, cell[0], cell[1]))
+                    continue
+                else:
+                    # Slower robots stop between grid points where the weights are shared
+                    # between cells, those still need the pairwise constraints.
+                    print("Robot %d is not on the integer grid, using pairwise same point constraints." % r)
+            for i,t in enumerate(steps[r][1:]):
+                t1 = m.addVars(t, range(4), vtype=GRB.BINARY, name='t%d'% t)
+                for j,s in enumerate(steps[r][:i+1]):
+                    rows = [x[r,t]-x[r,s] >= 0.1 - big_m(XB, (r,t), (r,s), 0.1, M)*t1[j,0],
+                            x[r,s]-x[r,t] >= 0.1 - big_m(XB, (r,s), (r,t), 0.1, M)*t1[j,1],
+                            y[r,t]-y[r,s] >= 0.1 - big_m(YB, (r,t), (r,s), 0.1, M)*t1[j,2],
+                            y[r,s]-y[r,t] >= 0.1 - big_m(YB, (r,s), (r,t), 0.1, M)*t1[j,3],
+                            t1[j,0] + t1[j,1] + t1[j,2] + t1[j,3] <= 3]
+                    if args.lazy:
+                        lazy[('same_point', r, t, s)] = rows
+                    else:
+                        for row in rows:
+                            m.addConstr(row)
+
+    # Synchronization Constraint: Specific path or 8 direction [NS, EW, NE-SW, NW-SE]
+    if args.sync == 'ns':
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                m.addConstr(x[r,t-1] - x[r,t] == 0)
+                m.addConstr(y[r,t] - y[r,t-1]  == v)
+    elif args.sync == 'sn':
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                m.addConstr(x[r,t-1] - x[r,t] == 0)
+                m.addConstr(y[r,t-1] - y[r,t] == v)
+    elif args.sync == 'ew':
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                m.addConstr(x[r,t-1] - x[r,t] == v)
+                m.addConstr(y[r,t-1] - y[r,t] == 0)
+    elif args.sync == 'we':
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                m.addConstr(x[r,t] - x[r,t-1] == v)
+                m.addConstr(y[r,t-1] - y[r,t] == 0)
+    elif args.sync == 'nwse':
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                m.addConstr(x[r,t] - x[r,t-1] == v)
+                m.addConstr(y[r,t] - y[r,t-1] == v)
+    elif args.sync == 'nesw':
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                m.addConstr(x[r,t-1] - x[r,t] == v)
+                m.addConstr(y[r,t] - y[r,t-1] == v)
+    elif args.sync == 'senw':
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                m.addConstr(x[r,t-1] - x[r,t] == v)
+                m.addConstr(y[r,t-1] - y[r,t] == v)
+    elif args.sync == 'swne':
+        for r in robots:
+            v = velocity_correction[r]
+            for t in steps[r][1:]:
+                m.addConstr(x[r,t] - x[r,t-1] == v)
+                m.addConstr(y[r,t-1] - y[r,t] == v)
+    elif args.sync == 'path':
+        #path = [(0,5), (1,4), (2,3), (3,2), (4,1), (5,0), (6,1), (7,2), (8,3), (9,4), (10,5), (9,6), (8,7), \
+        #(7,8), (6,9), (5,10), (4,9), (3,8), (2,7), (1,6), (0,5)]
+        path = [(0,0),(0,1),(-1,1), (-1,2), (-2,2), (-2,1)]
+        path_len = np.sum(np.abs(np.subtract(path[:-1],path[1:])))
+        for r in robots:
+            v = velocity_correction[r]
+            for i,t in enumerate(steps[r][4:3+len(path)]):
+                print(i,t)
+                m.addConstr(x[r,t] - x[r,t-1] == path[i+1][0] - path[i][0])
+                m.addConstr(y[r,t] - y[r,t-1] == path[i+1][1] - path[i][1])
+    elif args.sync == 'path_time':
+        #path = [(0,5), (1,4), (2,3), (3,2), (4,1), (5,0), (6,1), (7,2), (8,3), (9,4), (10,5), (9,6), (8,7), \
+        #(7,8), (6,9), (5,10), (4,9), (3,8), (2,7), (1,6), (0,5)]
+        path = [(4,3,7),(5,4,8),(6,5,9), (7,6,10), (7,7,11)]#, (2,6,10)]
+        path_len = np.sum(np.abs(np.subtract(path[:-1],path[1:])))
+        for r in robots:
+            v = velocity_correction[r]
+            times = [p[2] for p in path]
+            # pdb.set_trace()
+            for i,t in enumerate(times):
+                m.addConstr(x[r,t] == path[i][0])
+                m.addConstr(y[r,t] == path[i][1])
+
+
+    # Constraint to prevent colliding with other robots.
+    if args.collision_rad > 0:
+        M = 100
+        t2 = m.addVars(len(robots), len(robots), range(4), vtype=GRB.BINARY, name='t2')
+        for r in robots[1:]:
+            for s in range(r):
+                c = args.collision_rad
+                rows = [x[r,t]-x[s,t] >= c - big_m(XB, (r,t), (s,t), c, M)*t2[r,s,0] for t in steps[s][1:]] + \
+                       [x[s,t]-x[r,t] >= c - big_m(XB, (s,t), (r,t), c, M)*t2[r,s,1] for t in steps[s][1:]] + \
+                       [y[r,t]-y[s,t] >= c - big_m(YB, (r,t), (s,t), c, M)*t2[r,s,2] for t in steps[s][1:]] + \
+                       [y[s,t]-y[r,t] >= c - big_m(YB, (s,t), (r,t), c, M)*t2[r,s,3] for t in steps[s][1:]]
+                m.addConstr(t2[r,s,0] + t2[r,s,1] + t2[r,s,2] + t2[r,s,3] <= 3)
+                if args.lazy:
+                    lazy[('collision', r, s)] = rows
+                else:
+                    for row in rows:
+                        m.addConstr(row)
+
+    # Anti-Curling constraints go from [3,...,Np] and enforce ani-curling (this one works!)
+    if args.anti_curl:
+        for r in robots:
+            v = velocity_correction[r]
+            t_range = range(4)
+            t1 = m.addVars(steps[r], t_range, vtype=GRB.BINARY, name='t1')
+            delta = 2
+            t_delta = 3
+            M = 100
+            for t in steps[r][t_delta:]:
+                m.addConstr(x[r,t-2] - x[r,t] >= v*delta - big_m(XB, (r,t-2), (r,t), v*delta, M)*t1[t,0] )
+                m.addConstr(x[r,t] - x[r,t-2] >= v*delta - big_m(XB, (r,t), (r,t-2), v*delta, M)*t1[t,1])
+                m.addConstr(y[r,t-2] - y[r,t] >= v*delta - big_m(YB, (r,t-2), (r,t), v*delta, M)*t1[t,2])
+                m.addConstr(y[r,t] - y[r,t-2] >= v*delta - big_m(YB, (r,t), (r,t-2), v*delta, M)*t1[t,3])
+                m.addConstr(t1[t,0] + t1[t,1] + t1[t,2] + t1[t,3] <= 3)
+
+    # Curling constraints go from [2,...,Np] and enforce curing (Questionable functionality)
+    if args.force_curl:
+        for r in robots:
+            v = velocity_correction[r]
+            x_delta = 1
+            x_t_delta = 2
+            y_delta = 1
+            y_t_delta = 2
+
+            # This for x motion
+            m.addConstrs(x[r,t-x_t_delta] - x[r,t] <= v*x_delta for t in steps[r][x_t_delta:])
+            m.addConstrs(x[r,t] - x[r,t-x_t_delta] <= v*x_delta for t in steps[r][x_t_delta:])
+            # t_range = range(2)
+            # M = 1000
+            # t1 = m.addVars(steps[r][y_t_delta:], t_range, vtype=GRB.BINARY, name='t1')
+            # m.addConstrs(y[r,t-y_t_delta] - y[r,t] >= v*y_delta - M*t1[t,0] for t in steps[r][y_t_delta:])
+            # m.addConstrs(y[r,t] - y[r,t-y_t_delta] >= v*y_delta - M*t1[t,1] for t in steps[r][y_t_delta:])
+            # m.addConstrs(t1[t,0] + t1[t,1]  <= 1 for t in steps[r][y_t_delta:])
+            m.addConstrs(y[r,t-y_t_delta] - y[r,t] <= v*y_delta for t in steps[r][y_t_delta:])
+            m.addConstrs(y[r,t] - y[r,t-y_t_delta] <= v*y_delta for t in steps[r][y_t_delta:])
+
+            # This is for y motion
+            # m.addConstrs(y[r,t-y_t_delta] - y[r,t] <= v*y_delta for t in steps[r][y_t_delta:])
+            # m.addConstrs(y[r,t] - y[r,t-y_t_delta] <= v*y_delta for t in steps[r][y_t_delta:])
+            # t_range = range(2)
+            # M = 1000
+            # t1 = m.addVars(steps[r][x_t_delta:], t_range, vtype=GRB.BINARY, name='t1')
+            # m.addConstrs(x[r,t-x_t_delta] - x[r,t] >= v*x_delta - M*t1[t,0] for t in steps[r][x_t_delta:])
+            # m.addConstrs(x[r,t] - x[r,t-x_t_delta] >= v*x_delta - M*t1[t,1] for t in steps[r][x_t_delta:])
+            # m.addConstrs(t1[t,0] + t1[t,1]  <= 1 for t in steps[r][x_t_delta:])
+            # m.addConstrs(y[r,t-t_delta] - y[r,t] <= v*y_delta for t in steps[r][t_delta:])
+            # m.addConstrs(y[r,t] - y[r,t-t_delta] <= v*y_delta for t in steps[r][t_delta:])
+
+    # Straight path constraints (Questionable functionality)
+    if len(args.straight_line) > 0:
+        # Now we need to correct our previous velocity_correction by making sure the edges are the lengths of the edges are all equal.
+        path_len_x = args.straight_line[0]
+        path_len_y = args.straight_line[1]
+        delta = max(path_len_x,path_len_y)
+        print(delta, path_len_y)
+        M = 1000
+        for r in robots:
+            for v in velocity_correction:
+                inv_v = 1/v
+                if inv_v > 1:
+                    tv = m.addVars(steps[r][delta:], range(4), vtype=GRB.BINARY, name='t1')
+                    for t in steps[r][delta:]:
+                        m.addConstr(x[r,t-delta] - x[r,t] >= path_len_x*v - big_m(XB, (r,t-delta), (r,t), path_len_x*v, M)*tv[t,0] )
+                        m.addConstr(x[r,t] - x[r,t-delta] >= path_len_x*v - big_m(XB, (r,t), (r,t-delta), path_len_x*v, M)*tv[t,1] )
+                        m.addConstr(y[r,t-delta] - y[r,t] >= path_len_y*v - big_m(YB, (r,t-delta), (r,t), path_len_y*v, M)*tv[t,2] )
+                        m.addConstr(y[r,t] - y[r,t-delta] >= path_len_y*v - big_m(YB, (r,t), (r,t-delta), path_len_y*v, M)*tv[t,3] )
+                        m.addConstr(tv[t,0] + tv[t,1] + tv[t,2] + tv[t,3] == 3 )
+                else:
+                    # Working better
+                    ts = m.addVars(steps[r][delta:], range(4), vtype=GRB.BINARY, name='ts')
+                    for t in steps[r][delta:]:
+                        m.addConstr(x[r,t-path_len_x] - x[r,t] >= path_len_x - big_m(XB, (r,t-path_len_x), (r,t), path_len_x, M)*ts[t,0])
+                        m.addConstr(x[r,t] - x[r,t-path_len_x] >= path_len_x - big_m(XB, (r,t), (r,t-path_len_x), path_len_x, M)*ts[t,1])
+                        m.addConstr(y[r,t-path_len_y] - y[r,t] >= path_len_y - big_m(YB, (r,t-path_len_y), (r,t), path_len_y, M)*ts[t,2])
+                        m.addConstr(y[r,t] - y[r,t-path_len_y] >= path_len_y - big_m(YB, (r,t), (r,t-path_len_y), path_len_y, M)*ts[t,3])
+                        m.addConstr(ts[t,0] + ts[t,1] + ts[t,2] + ts[t,3] == 3 )
+                        #
+
+    # Area Constraint (Start with square, expand to more complex shapes)
+    if len(args.rect_area) > 0:
+        for r in robots:
+            area = args.rect_area
+            m.addConstrs(x[r,t] >= area[0] for t in steps[r][1:])
+            m.addConstrs(x[r,t] <= area[1] for t in steps[r][1:])
+            m.addConstrs(y[r,t] >= area[2] for t in steps[r][1:])
+            m.addConstrs(y[r,t] <= area[3] for t in steps[r][1:])
 
-def main():
+    # End constraint updates, seting objective
+    m.update()
+    obj = quicksum(f[r,t] for r in robots for t in steps[r])
+    m.setObjective(obj, GRB.MAXIMIZE)
+    m.update()
+    build_time = time.time() - build_start
+    print("Model build time (sec): %f" % build_time)
+
+    model_vars = {'x': x, 'y': y, 'f': f, 'b': b, 'lx': lx, 'ly': ly, 'lxy': lxy, 'arcs': arcs, 'lazy': lazy,
+                  'init_x': init_x, 'init_y': init_y, 'init_f': init_f}
+    if len(args.param_file) > 0:
+        apply_param_file(m, model_vars, args)
+    return m, model_vars
+
+def apply_param_file(m, model_vars, args):
+    # Solver parameters from --param_file, a yaml file of Gurobi parameter names and
+    # values like the one tune.py writes. BranchPriority is not a Gurobi parameter,
+    # 'b' branches on the motion binaries first and 'lambda' on the interpolation
+    # weights (the arcs for the flow formulation). The other backends only use the
+    # parameters they know (TimeLimit, MIPGap).
+    for key, value in load_yaml(args.param_file).items():
+        if key == 'BranchPriority':
+            if args.backend != 'gurobi':
+                continue
+            for name in (['b'] if value == 'b' else ['lx', 'ly', 'arcs']):
+                if model_vars[name] is not None:
+                    for v in model_vars[name].values():
+                        v.BranchPriority = 1
+        else:
+            setattr(m.Params, key, value)
 
+def load_start(model_vars, args, paths, field_slices, values=None):
+    # Loads paths (one list of [x,y] waypoints per robot) as the MIP start of a model
+    # made by build_model, or into values, see apply_start.
+    if args.formulation == 'flow':
+        set_flow_start(paths, model_vars['arcs'], get_directions(args.direction_constr), values)
+    else:
+        set_mip_start(paths, model_vars['x'], model_vars['y'], model_vars['b'], model_vars['lx'], model_vars['ly'], model_vars['lxy'], model_vars['f'], field_slices, values)
+
+def solve_model(m, model_vars, args, steps, shared=None):
+    # Runs the optimizer, with the lazy constraint callback or rounds if any
+    # constraint groups were held back. With --trace_dir the solve progress is
+    # returned as (time, incumbent, bound, gap) rows, otherwise None. shared is
+    # given to --portfolio members to swap incumbents with the others.
+    lazy = model_vars['lazy'] if args.lazy else {}
+    trace = [] if len(args.trace_dir) > 0 else None
+    x = model_vars['x']
+    y = model_vars['y']
+    if len(lazy) > 0:
+        print("Holding back %d same point/collision constraint groups as lazy constraints." % len(lazy))
+    if args.backend == 'gurobi' and (len(lazy) > 0 or trace is not None or shared is not None):
+        m._lazy = lazy
+        m._x = x
+        m._y = y
+        m._steps = steps
+        m._collision_rad = args.collision_rad
+        m._trace = trace
+        m._shared = shared
+        if len(lazy) > 0:
+            m.Params.LazyConstraints = 1
+        m.optimize(mip_callback)
+    elif len(lazy) > 0:
+        optimize_lazy_rounds(m, lazy, x, y, steps, args.collision_rad, args.time_limit, trace)
+    else:
+        m.optimize()
+        if trace is not None and m.SolCount > 0:
+            # No callbacks through scipy, only the end of the solve is known.
+            add_trace_row(trace, m.Runtime, m.ObjVal, m.ObjBound if m.ObjBound is not None else m.ObjVal)
+    return trace
+
+def save_trace(args, trace, start_point):
+    # Writes the solve progress of one run to its own CSV file in --trace_dir and
+    # returns the path, which goes in the 'Trace File' column of the results.
+    if trace is None:
+        return ''
+    os.makedirs(args.trace_dir, exist_ok=True)
+    filename = os.path.join(args.trace_dir, 'mip_trace_' + time.strftime("%Y%m%d-%H%M%S") + ('%.6f' % time.time())[-6:] + \
+                            '_start_' + '_'.join([str(p) for p in start_point]) + '_budget_%g' % args.planning_time + '.csv')
+    with open(filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Time (sec)', 'Incumbent', 'Bound', 'Gap'])
+        for row in trace:
+            writer.writerow(['' if v is None else v for v in row])
+    return filename
+
+def get_paths(m, model_vars, steps):
+    # Solution paths, one list of (x,y) waypoints per robot.
+    path_x = m.getAttr('X', model_vars['x']).values()
+    path_y = m.getAttr('X', model_vars['y']).values()
+    _paths = list(zip(path_x, path_y))
+    paths = []
+    for r in range(len(steps)):
+        paths.append(_paths[0:len(steps[r])])
+        _paths = _paths[len(steps[r]):]
+    return paths
+
+
+def get_parser():
     parser = argparse.ArgumentParser(description='Parser for MIP testing')
     parser.add_argument(
         '-i', '--infile_path',
@@ -157,6 +1619,13 @@ def main():
         default=(0,0),
         help='Starting points for robots for planning purposes, returns list [x0,y0,x1,y1,...,xN,yN] for 1...N robots.',
         )
+    parser.add_argument(
+        '--multi_start',
+        nargs='*',
+        type=int,
+        default=[],
+        help='List of start points to plan from one after the other, [x0,y0,...,xN,yN] for each start of N robots. The model is built once and only its start constraints change, one CSV row is written per start. Replaces --start_point. Plain solves only, not with --portfolio, --decompose, --horizon, --coarse or --incremental.',
+        )
     parser.add_argument(
         '-e', '--end_point',
         nargs=2,
@@ -197,6 +1666,25 @@ def main():
         action='store_false',
         help='By default it will not allow a point to be visited twice in the same planning period. Include this flag to allow, might allow for more flexible planning.',
         )
+    parser.add_argument(
+        '--revisit_encoding',
+        nargs='?',
+        type=str,
+        default='pairwise',
+        choices=['pairwise', 'occupancy'],
+        help='How the same point constraint is written. "pairwise" adds big-M constraints for every pair of steps (O(T^2)). \
+        "occupancy" caps the number of visits of each grid cell at 1, which grows linearly in T.',
+        )
+    parser.add_argument(
+        '--lazy',
+        action='store_true',
+        help='Leaves the pairwise same point and collision constraints out of the model and only adds the ones a solution violates (Gurobi lazy constraint callback, repeated solves for other backends).',
+        )
+    parser.add_argument(
+        '--symmetry',
+        action='store_true',
+        help='Adds symmetry breaking constraints for identical robots (same robots.yaml config apart from color) with the same start point, so the solver does not search every ordering of their paths.',
+        )
     parser.add_argument(
         '--anti_curl',
         action='store_true',
@@ -230,6 +1718,119 @@ def main():
         default=0.0,
         help='Collision Radius between robots.',
         )
+    parser.add_argument(
+        '--reachable',
+        action='store_true',
+        help='Only builds the interpolation variables for the grid cells a robot can reach at each step from its start (and end) point. Shrinks the model a lot on larger maps.',
+        )
+    parser.add_argument(
+        '--tighten',
+        action='store_true',
+        help='Bounds the position of each robot at each step by the box it can reach from its start (and end) point and --rect_area, and uses the smallest valid big-M in the same point, collision, anti-curl and straight line constraints instead of the constants. Gives a tighter relaxation so fewer nodes.',
+        )
+    parser.add_argument(
+        '--backend',
+        nargs='?',
+        type=str,
+        default='gurobi',
+        choices=BACKENDS,
+        help='MILP solver used for planning. "gurobi" needs a license, "highs" solves the same model with HiGHS through scipy.',
+        )
+    parser.add_argument(
+        '--threads',
+        nargs='?',
+        type=int,
+        default=0,
+        help='Number of solver threads. Default lets the solver decide, set to 1 when running many plans side by side.',
+        )
+    parser.add_argument(
+        '--formulation',
+        nargs='?',
+        type=str,
+        default='sos2',
+        choices=['sos2', 'flow'],
+        help='Model used for planning. "sos2" uses continuous positions with SOS2 interpolation of the field. \
+        "flow" uses a time-expanded network with one binary per cell and direction each step, which has a much tighter LP bound. Needs all robots to move whole grid cells per step.',
+        )
+    parser.add_argument(
+        '--matrix_build',
+        action='store_true',
+        help='Builds the interpolation variables and constraints with the gurobipy matrix interface. Much faster to build on large grids. Only used with the gurobi backend.',
+        )
+    parser.add_argument(
+        '--warm_start',
+        nargs='?',
+        type=str,
+        default='',
+        help='Gives the MIP a starting solution. "greedy" runs the greedy planner first, "team" the joint greedy planner that keeps the robots apart (greedy.py --joint), otherwise a .npy file of paths saved with --save_path by mcts.py or random_move.py. Only used by the gurobi backend.',
+        )
+    parser.add_argument(
+        '--horizon',
+        nargs='?',
+        type=float,
+        default=0,
+        help='Receding horizon planning for long budgets. Plans this many hours at a time, keeps the first --commit_steps of the plan and plans again from there. Default 0 solves the whole budget at once.',
+        )
+    parser.add_argument(
+        '--commit_steps',
+        nargs='?',
+        type=int,
+        default=0,
+        help='Steps of each receding horizon window that are kept before planning again. Default is half the window.',
+        )
+    parser.add_argument(
+        '--horizon_compare',
+        action='store_true',
+        help='After a receding horizon run also solves the whole budget at once and prints the objective gap between the two.',
+        )
+    parser.add_argument(
+        '--decompose',
+        action='store_true',
+        help='Plans each robot as its own MIP in parallel worker processes, coupled by a Lagrangian relaxation of one robot per grid point per step. Prints the objective, the bound of the relaxation (not of the full model) and the wall time. --time_limit is split over the subproblem solves. --collision_rad can be at most 1 (one grid cell) and is checked on the plans, not relaxed.',
+        )
+    parser.add_argument(
+        '--decompose_iters',
+        nargs='?',
+        type=int,
+        default=20,
+        help='Maximum number of subgradient iterations of --decompose.',
+        )
+    parser.add_argument(
+        '--workers',
+        nargs='?',
+        type=int,
+        default=0,
+        help='Number of worker processes for --decompose. Default is one per robot, up to the number of cores.',
+        )
+    parser.add_argument(
+        '--trace_dir',
+        nargs='?',
+        type=str,
+        default='',
+        help='Directory to log the solve progress (time, incumbent, bound, gap) of each run to, one CSV file per run. The file is listed in a "Trace File" column of the results. Gurobi logs every incumbent and bound change, HiGHS only the end of each solve.',
+        )
+    parser.add_argument(
+        '--portfolio',
+        nargs='*',
+        type=str,
+        default=None,
+        choices=list(PORTFOLIO),
+        help='Solves the plan with several solver settings at once, one process each, and stops as soon as one of them reaches --target_gap or the --time_limit deadline. Gurobi members share incumbents. Lists the members to run, all of them when none are given. What each member contributed is printed at the end.',
+        )
+    parser.add_argument(
+        '--target_gap',
+        nargs='?',
+        type=float,
+        default=1e-4,
+        help='Relative MIP gap the --portfolio members stop at.',
+        )
+    parser.add_argument(
+        '--param_file',
+        nargs='?',
+        type=str,
+        default='',
+        help='Yaml file of solver parameters to use, e.g. the best_params.yaml written by tune.py.',
+        )
     parser.add_argument(
         '--gen_image',
         action='store_true',
@@ -248,7 +1849,84 @@ def main():
         help='Name of the Experiement you are running',
         )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        '--coarse',
+        nargs='?',
+        type=int,
+        default=0,
+        help='Coarse to fine planning. Solves on the field downsampled by this factor (e.g. 2 or 4) first, then at full resolution only around the coarse path, warm started from it. For fine resolutions over large maps where the full model is too big. Used instead of the plain solve, not with --portfolio, --decompose or --horizon.',
+        )
+    parser.add_argument(
+        '--corridor',
+        nargs='?',
+        type=float,
+        default=2,
+        help='With --coarse, how many grid cells the full resolution plan may stray from the coarse path on either side.',
+        )
+    parser.add_argument(
+        '--cache_dir',
+        nargs='?',
+        type=str,
+        default='',
+        help='Directory of the result cache, see cache.py. A run with exactly the same field, robots, start, budget, arguments, --param_file and code uses the stored plan instead of solving. Off by default.',
+        )
+    parser.add_argument(
+        '--force_solve',
+        action='store_true',
+        help='With --cache_dir, solves even if the run is in the cache and replaces the stored result.',
+        )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='With --sweep_budgets, solves the budgets of each start in increasing order. The plan of the previous budget, extended with greedy steps, is the MIP start of the next one and its objective the cutoff. Only for the plain solve (no --portfolio, --decompose, --horizon or --coarse) with the gurobi backend, other combinations are rejected. --sweep_starts are then planned one after the other instead of with --multi_start.',
+        )
+
+    add_sweep_args(parser)
+    return parser
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+
+    if args.matrix_build and args.backend != 'gurobi':
+        print("--matrix_build needs the gurobi backend, building the model with expressions instead.")
+        args.matrix_build = False
+
+    # One model re-optimized for every start is only the plain solve, the other
+    # modes would be skipped while their CSV rows still carry the mode's name.
+    modes = [name for name, on in [('--portfolio', args.portfolio is not None), ('--decompose', args.decompose),
+                                   ('--horizon', args.horizon > 0), ('--coarse', args.coarse > 1),
+                                   ('--incremental', args.incremental)] if on]
+    if len(args.multi_start) > 0 and len(modes) > 0:
+        parser.error("--multi_start only works with the plain solve, not with %s. Use --sweep_starts to plan each start on its own." % ', '.join(modes))
+
+    if args.incremental:
+        # The previous budget's plan is only handed on in the plain gurobi solve.
+        skipped = [name for name in modes if name != '--incremental'] + (['--backend %s' % args.backend] if args.backend != 'gurobi' else [])
+        if len(skipped) > 0:
+            parser.error("--incremental only works with the plain solve and the gurobi backend, not with %s." % ', '.join(skipped))
+
+    if args.decompose and args.collision_rad > 1:
+        # Robots on different grid points are at least a cell apart, a larger radius
+        # is not something the relaxed coupling can stand in for.
+        parser.error("--decompose only relaxes one robot per grid point, --collision_rad can be at most 1 grid cell with it.")
+
+    if len(args.sweep_starts) > 0 and len(modes) == 0:
+        # The starts are planned for with one model, see --multi_start. Otherwise
+        # sweep_configs runs every start through plan() like the budgets and centers.
+        args.multi_start = args.multi_start + args.sweep_starts
+        args.sweep_starts = []
+
+    # With --incremental the plan of each (center, start) is handed to the next budget.
+    last = {}
+    for run_args in sweep_configs(args, args.incremental):
+        key = (str(run_args.sim_center), str(run_args.start_point))
+        last[key] = plan(run_args, last.get(key) if args.incremental else None)
+
+def plan(args, previous=None):
+    # Plans for one configuration of the sweep, see sweep.py. previous is the
+    # (paths, objective) of the same start with a smaller budget, see --incremental.
+    # Returns the (paths, objective) of this plan.
 
     # Path lenth in time (hours).
     Np = args.planning_time
@@ -258,15 +1936,14 @@ def main():
         # ROMS map
         # Loading Simulation-Specific Parameters
 
-        with open(os.path.expandvars(args.sim_cfg),'rb') as f:
-            yaml_sim = yaml.load(f.read())
+        yaml_sim = load_yaml(args.sim_cfg, args.sim_center)
 
         # If running many test on the same map this will save you time by not having to reload the map from scratch each run. Saved me probably 10s of hours.
         fieldSavePath = '/home/mlfrantz/Documents/MIP_Research/mip_research/cfg/normal_field_{}_{}.npy'.format(str(abs(yaml_sim['sim_world']['center_longitude'])),yaml_sim['sim_world']['center_latitude'])
 
         try:
-            field = np.load(fieldSavePath)
-            norm_field = np.load(fieldSavePath)
+            field = load_saved_field(fieldSavePath)
+            norm_field = load_saved_field(fieldSavePath)
             print("Loaded Map Successfully")
         except IOError:
 
@@ -292,393 +1969,169 @@ def main():
             np.save(fieldSavePath, field)
 
         # Example of an obstacle, make the value very low in desired area
-        # field[int(len(field)/4):int(3*len(field)/4),int(len(field)/4):int(3*len(field)/4)] = -100
-
-        field_resolution = (yaml_sim['sim_world']['resolution'],yaml_sim['sim_world']['resolution'])
-
-    else:
-        # Problem data, matrix transposed to allow for proper x,y coordinates to be mapped wih i,j
-        # field = np.genfromtxt(args.infile_path, delimiter=',', dtype=float).transpose()
-        field_resolution = (1,1)
-        field = np.load(args.infile_path)
-        field = np.moveaxis(field,0,-1)
-        # field = np.transpose(field)
-        norm_field = np.load(args.infile_path)
-        norm_field = np.moveaxis(norm_field,0,-1)
-        pdb.set_trace()
-
-        print("Loaded Map Successfully")
-
-    if args.gradient:
-        # I would advise not using this as I don't believe it was doing what I thought it was.
-
-        # pdb.set_trace()
-        grad_field = np.gradient(field[:,:,0])
-        mag_grad_field = np.dot(grad_field[0],grad_field[1]) #np.sqrt(grad_field[1]**2)# + grad_field[1]**2)
-
-    # Load the robots.yaml Configuration file.
-    with open(os.path.expandvars(args.robots_cfg),'rb') as f:
-        yaml_mission = yaml.load(f.read())
-
-    # Get the speed of each robot that we are planning for.
-    steps = []
-    colors = []
-    for key,value in [(k,v) for k,v in yaml_mission.items() if k in args.robots]:
-        # Number of 1Km steps the planner can plan for.
-        # The expresseion solves for the number of waypoints so a +1 is needed for range.
-        # For instance, a glider going 0.4m/s would travel 1.44Km in 1 hour so it needs at least 2 waypoints, start and end.
-        plan_range = int(np.round(value['vel']*Np*60*60*0.001*(1/min(field_resolution))))+1
-        print(plan_range)
-        if plan_range > 0:
-            steps.append(range(plan_range))
-        else:
-            steps.append(range(2))
-        colors.append(value['color'])
-
-    temp_len = [len(s) for s in steps]
-    steps = [steps[np.argmax(temp_len)]]*len(steps) # This makes everything operate at the same time
-    velocity_correction = [t/max(temp_len) for t in temp_len] # To account for time difference between arriving to waypoints
-    # velocity_correction = [1 for t in temp_len] # To account for time difference between arriving to waypoints
-
-    # Make time correction for map forward propagation. This is only used on time-varying maps.
-    max_steps = max([len(s) for s in steps])
-    field_delta = int(max_steps/Np)
-    t_step = 0
-    k_step = 0
-    field_time_steps = []
-    for i in range(max_steps):
-        field_time_steps.append(t_step)
-        k_step += 1
-        if k_step == field_delta:
-            k_step = 0
-            t_step += 1
-
-    # Number of robots we are planning for.
-    robots = range(len(args.robots))
-
-    DX = np.arange(field.shape[0]) # Integer values for range of X coordinates
-    DY = np.arange(field.shape[1]) # Integer values for range of Y coordinates
-
-    m = Model() # This defines a model inside Gurobi.
-    if args.time_limit > 0:
-        # Sets a runtime limit. Default is to run to completion.
-        m.Params.TIME_LIMIT = args.time_limit
-    # m.Params.MIPGap = 0.01 # Allows the model to run until the solution is within a certain range of the optimal.
-
-    # Add variables
-    pairs = tuplelist([(r,s) for r in robots for s in steps[r]])
-
-    x = m.addVars(pairs, lb=DX[0], ub=DX[-1], vtype=GRB.CONTINUOUS, name='x')
-    y = m.addVars(pairs, lb=DY[0], ub=DY[-1], vtype=GRB.CONTINUOUS, name='y')
-
-    # If we are taking the gradient of the field
-    if args.gradient:
-        f = m.addVars(pairs ,lb=np.min(mag_grad_field), ub=np.max(mag_grad_field), vtype=GRB.CONTINUOUS, name='f')
-    else:
-        f = m.addVars(pairs, lb=np.min(field), ub=np.max(field), vtype=GRB.CONTINUOUS, name='f')
-
-    lx = m.addVars(pairs, DX, lb=0, ub=1, vtype=GRB.CONTINUOUS, name='lx')
-    ly = m.addVars(pairs, DY, lb=0, ub=1, vtype=GRB.CONTINUOUS, name='ly')
-    lxy = m.addVars(pairs, DX, DY, vtype=GRB.CONTINUOUS, name='lxy')
-
-    for r in robots:
-        for t in steps[r]:
-            m.addSOS(GRB.SOS_TYPE2, [lx[r,t,i] for i in DX])
-            m.addSOS(GRB.SOS_TYPE2, [ly[r,t,j] for j in DY])
-
-    budget = m.addVars(pairs, lb=0, ub=len(steps[0]), vtype=GRB.CONTINUOUS, name="budget")
-    m.addConstrs((budget[r, steps[r][0]] == len(steps[0]) for r in robots), name="Initial Budget")
-
-    # Add main constraints
-
-    # Starting position contraint
-    start = args.start_point
-    if len(start) > 2:
-        # More than one robot.
-        start = [start[i:i + 2] for i in range(0, len(start), 2)]
-    else:
-        # One robot, extra list needed for nesting reasons.
-        start = [start]
-
-    m.addConstrs((x[r, steps[r][0]] == start[r][0] for r in robots), name="Initial x")
-    m.addConstrs((y[r, steps[r][0]] == start[r][1] for r in robots), name="Initial y")
-
-    if args.gradient:
-        m.addConstrs((f[r, steps[r][0]] == mag_grad_field[start[r][0], start[r][1]] for r in robots), name="Initial f")
-    else:
-        m.addConstrs((f[r, steps[r][0]] == field[start[r][0], start[r][1], 0] for r in robots), name="Initial f")
-
-    # Optional end position constraint. Could implement additional position constaint
-    if len(args.end_point) > 0 :
-        end = args.end_point
-        m.addConstrs((x[r, steps[r][-1]] == end[0] for r in robots), name="End x")
-        m.addConstrs((y[r, steps[r][-1]] == end[1] for r in robots), name="End y")
-        # m.addConstr((f[r, steps[r][-1]] == field[end[0], end[1], -1] for r in robots), name="End f")
-
-    for r in robots:
-        for t in steps[r]:
-            m.addConstrs(quicksum(lxy[r, t, i, j] for j in DY) == lx[r, t, i] for i in DX)
-            m.addConstrs(quicksum(lxy[r, t, i, j] for i in DX) == ly[r, t, j] for j in DY)
-
-    m.addConstrs((quicksum(lx[r, t, i] for i in DX) == 1 for r in robots for t in steps[r]))
-    m.addConstrs((quicksum(ly[r, t, j] for j in DY) == 1 for r in robots for t in steps[r]))
-
-    m.addConstrs((quicksum(DX[i]*lx[r,t,i] for i in DX) == x[r,t] for r in robots for t in steps[r]))
-    m.addConstrs((quicksum(DY[j]*ly[r,t,j] for j in DY) == y[r,t] for r in robots for t in steps[r]))
-
-    if args.gradient:
-        m.addConstrs((quicksum(mag_grad_field[i,j]*lxy[r,t,i,j] for i in DX for j in DY) == f[r,t] for r in robots for t in steps[r]))
-    else:
-        if args.time_vary:
-            # This map is time varying
-            m.addConstrs((quicksum(field[i,j,field_time_steps[t]]*lxy[r,t,i,j] for i in DX for j in DY) == f[r,t] for r in robots for t in steps[r]))
-        else:
-            # This map is static
-            m.addConstrs((quicksum(field[i,j,0]*lxy[r,t,i,j] for i in DX for j in DY) == f[r,t] for r in robots for t in steps[r]))
-
-    # Primary Motion constraints
-
-    # There is something to this but it doesnt work as is
-    #
-    # if len(args.straight_line) > 0:
-    #     # Now we need to correct our previous velocity_correction by making sure the edges are the lengths of the edges are all equal.
-    #     path_len_x = args.straight_line[0]
-    #     path_len_y = args.straight_line[1]
-    #
-    #     # if path_len_x > 1 or path_len_y > 1:
-    #     #     print(steps)
-    #     #     pdb.set_trace()
-    #     #     for r in robots:
-    #     #         steps = [s for s in steps[r]]
-    #
-    # else:
-    path_len_x = 1
-    path_len_y = 1
-
-    # for r in robots:
-    #     v = velocity_correction[r]
-    #     m.addQConstr( (quicksum( (((x[r,t-1]-x[r,t])*(x[r,t-1]-x[r,t])) + \
-    #                   ((y[r,t-1]-y[r,t])*(y[r,t-1]-y[r,t]))) for t in steps[r][1:])) <= (len(steps[r]))  ) # -1 becuase we added a step above
-
-    # m.addConstrs(( quicksum( ((x[r,t-1]-x[r,t])*(x[r,t-1]-x[r,t])) + ((y[r,t-1]-y[r,t])*(y[r,t-1]-y[r,t])) )  <= len(steps[r]) for r in robots for t in steps[r][1:] ))
-
-    # Binary variables for motion constraints
-    b_range = range(4)
-    b = m.addVars(pairs, b_range, vtype=GRB.BINARY, name='b%d' % t)
-    for r in robots:
-        v = velocity_correction[r]
-        for t in steps[r][1:]:
-            # pdb.set_trace()
-            m.addConstr(x[r,t-1] + v*path_len_x*b[r,t,0] - v*path_len_x*b[r,t,1] == x[r,t])
-            m.addConstr(b[r,t,0] + b[r,t,1] <= 1)
-            m.addConstr(y[r,t-1] + v*path_len_y*b[r,t,2] - v*path_len_y*b[r,t,3] == y[r,t])
-            m.addConstr(b[r,t,2] + b[r,t,3] <= 1)
-            # m.addConstr(budget[r,t-1] - (b[r,t,0] + b[r,t,1] + b[r,t,2] + b[r,t,3])  == budget[r,t])
+        # field[int(len(field)/4):int(3*len(field)/4),int(len(field)/4):int(3*len(field)/4)] = -100
 
-    # Add option constraints
+        field_resolution = (yaml_sim['sim_world']['resolution'],yaml_sim['sim_world']['resolution'])
 
-    # Direction constraints PCA/Eignevector/Cardinal constraints
-    if args.direction_constr == '8_direction':
-        m.addConstrs(b[r,t,0] + b[r,t,1] + b[r,t,2] + b[r,t,3] >= 1 for r in robots for t in steps[r][1:])
-    elif args.direction_constr == 'nsew':
-        m.addConstrs(b[r,t,0] + b[r,t,1] + b[r,t,2] + b[r,t,3] == 1 for r in robots for t in steps[r][1:]) #PCA N-S-E-W
-    elif args.direction_constr == 'diag':
-        m.addConstrs(b[r,t,0] + b[r,t,1] + b[r,t,2] + b[r,t,3] == 2 for r in robots for t in steps[r][1:]) #PCA Diag
+    else:
+        # Problem data, matrix transposed to allow for proper x,y coordinates to be mapped wih i,j
+        # field = np.genfromtxt(args.infile_path, delimiter=',', dtype=float).transpose()
+        field_resolution = (1,1)
+        field = np.load(args.infile_path)
+        field = np.moveaxis(field,0,-1)
+        # field = np.transpose(field)
+        norm_field = np.load(args.infile_path)
+        norm_field = np.moveaxis(norm_field,0,-1)
+        pdb.set_trace()
 
-    # Constraint to prevent going through the same point twice
-    if args.same_point:
-        M = 100
-        for r in robots:
-            for i,t in enumerate(steps[r][1:]):
-                t1 = m.addVars(t, range(4), vtype=GRB.BINARY, name='t%d'% t)
-                for j,s in enumerate(steps[r][:i+1]):
-                    m.addConstr(x[r,t]-x[r,s] >= 0.1 - M*t1[j,0])
-                    m.addConstr(x[r,s]-x[r,t] >= 0.1 - M*t1[j,1])
-                    m.addConstr(y[r,t]-y[r,s] >= 0.1 - M*t1[j,2])
-                    m.addConstr(y[r,s]-y[r,t] >= 0.1 - M*t1[j,3])
-                    m.addConstr(t1[j,0] + t1[j,1] + t1[j,2] + t1[j,3] <= 3)
+        print("Loaded Map Successfully")
 
-    # Synchronization Constraint: Specific path or 8 direction [NS, EW, NE-SW, NW-SE]
-    if args.sync == 'ns':
-        for r in robots:
-            v = velocity_correction[r]
-            for t in steps[r][1:]:
-                m.addConstr(x[r,t-1] - x[r,t] == 0)
-                m.addConstr(y[r,t] - y[r,t-1]  == v)
-    elif args.sync == 'sn':
-        for r in robots:
-            v = velocity_correction[r]
-            for t in steps[r][1:]:
-                m.addConstr(x[r,t-1] - x[r,t] == 0)
-                m.addConstr(y[r,t-1] - y[r,t] == v)
-    elif args.sync == 'ew':
-        for r in robots:
-            v = velocity_correction[r]
-            for t in steps[r][1:]:
-                m.addConstr(x[r,t-1] - x[r,t] == v)
-                m.addConstr(y[r,t-1] - y[r,t] == 0)
-    elif args.sync == 'we':
-        for r in robots:
-            v = velocity_correction[r]
-            for t in steps[r][1:]:
-                m.addConstr(x[r,t] - x[r,t-1] == v)
-                m.addConstr(y[r,t-1] - y[r,t] == 0)
-    elif args.sync == 'nwse':
-        for r in robots:
-            v = velocity_correction[r]
-            for t in steps[r][1:]:
-                m.addConstr(x[r,t] - x[r,t-1] == v)
-                m.addConstr(y[r,t] - y[r,t-1] == v)
-    elif args.sync == 'nesw':
-        for r in robots:
-            v = velocity_correction[r]
-            for t in steps[r][1:]:
-                m.addConstr(x[r,t-1] - x[r,t] == v)
-                m.addConstr(y[r,t] - y[r,t-1] == v)
-    elif args.sync == 'senw':
-        for r in robots:
-            v = velocity_correction[r]
-            for t in steps[r][1:]:
-                m.addConstr(x[r,t-1] - x[r,t] == v)
-                m.addConstr(y[r,t-1] - y[r,t] == v)
-    elif args.sync == 'swne':
-        for r in robots:
-            v = velocity_correction[r]
-            for t in steps[r][1:]:
-                m.addConstr(x[r,t] - x[r,t-1] == v)
-                m.addConstr(y[r,t-1] - y[r,t] == v)
-    elif args.sync == 'path':
-        #path = [(0,5), (1,4), (2,3), (3,2), (4,1), (5,0), (6,1), (7,2), (8,3), (9,4), (10,5), (9,6), (8,7), \
-        #(7,8), (6,9), (5,10), (4,9), (3,8), (2,7), (1,6), (0,5)]
-        path = [(0,0),(0,1),(-1,1), (-1,2), (-2,2), (-2,1)]
-        path_len = np.sum(np.abs(np.subtract(path[:-1],path[1:])))
-        for r in robots:
-            v = velocity_correction[r]
-            for i,t in enumerate(steps[r][4:3+len(path)]):
-                print(i,t)
-                m.addConstr(x[r,t] - x[r,t-1] == path[i+1][0] - path[i][0])
-                m.addConstr(y[r,t] - y[r,t-1] == path[i+1][1] - path[i][1])
-    elif args.sync == 'path_time':
-        #path = [(0,5), (1,4), (2,3), (3,2), (4,1), (5,0), (6,1), (7,2), (8,3), (9,4), (10,5), (9,6), (8,7), \
-        #(7,8), (6,9), (5,10), (4,9), (3,8), (2,7), (1,6), (0,5)]
-        path = [(4,3,7),(5,4,8),(6,5,9), (7,6,10), (7,7,11)]#, (2,6,10)]
-        path_len = np.sum(np.abs(np.subtract(path[:-1],path[1:])))
-        for r in robots:
-            v = velocity_correction[r]
-            times = [p[2] for p in path]
-            # pdb.set_trace()
-            for i,t in enumerate(times):
-                m.addConstr(x[r,t] == path[i][0])
-                m.addConstr(y[r,t] == path[i][1])
+    if args.gradient:
+        # I would advise not using this as I don't believe it was doing what I thought it was.
 
+        # pdb.set_trace()
+        grad_field = np.gradient(field[:,:,0])
+        mag_grad_field = np.dot(grad_field[0],grad_field[1]) #np.sqrt(grad_field[1]**2)# + grad_field[1]**2)
 
-    # Constraint to prevent colliding with other robots.
-    if args.collision_rad > 0:
-        M = 100
-        t2 = m.addVars(len(robots), len(robots), range(4), vtype=GRB.BINARY, name='t2')
-        for r in robots[1:]:
-            for s in range(r):
-                m.addConstrs(x[r,t]-x[s,t] >= args.collision_rad - M*t2[r,s,0] for t in steps[s][1:])
-                m.addConstrs(x[s,t]-x[r,t] >= args.collision_rad - M*t2[r,s,1] for t in steps[s][1:])
-                m.addConstrs(y[r,t]-y[s,t] >= args.collision_rad - M*t2[r,s,2] for t in steps[s][1:])
-                m.addConstrs(y[s,t]-y[r,t] >= args.collision_rad - M*t2[r,s,3] for t in steps[s][1:])
-                m.addConstr(t2[r,s,0] + t2[r,s,1] + t2[r,s,2] + t2[r,s,3] <= 3)
+    # Load the robots.yaml Configuration file.
+    yaml_mission = load_yaml(args.robots_cfg)
 
-    # Anti-Curling constraints go from [3,...,Np] and enforce ani-curling (this one works!)
-    if args.anti_curl:
-        for r in robots:
-            v = velocity_correction[r]
-            t_range = range(4)
-            t1 = m.addVars(steps[r], t_range, vtype=GRB.BINARY, name='t1')
-            delta = 2
-            t_delta = 3
-            M = 100
-            for t in steps[r][t_delta:]:
-                m.addConstr(x[r,t-2] - x[r,t] >= v*delta - M*t1[t,0] )
-                m.addConstr(x[r,t] - x[r,t-2] >= v*delta - M*t1[t,1])
-                m.addConstr(y[r,t-2] - y[r,t] >= v*delta - M*t1[t,2])
-                m.addConstr(y[r,t] - y[r,t-2] >= v*delta - M*t1[t,3])
-                m.addConstr(t1[t,0] + t1[t,1] + t1[t,2] + t1[t,3] <= 3)
+    # Get the speed of each robot that we are planning for.
+    steps = []
+    colors = []
+    configs = []
+    for key,value in [(k,v) for k,v in yaml_mission.items() if k in args.robots]:
+        # Number of 1Km steps the planner can plan for.
+        # The expresseion solves for the number of waypoints so a +1 is needed for range.
+        # For instance, a glider going 0.4m/s would travel 1.44Km in 1 hour so it needs at least 2 waypoints, start and end.
+        plan_range = int(np.round(value['vel']*Np*60*60*0.001*(1/min(field_resolution))))+1
+        print(plan_range)
+        if plan_range > 0:
+            steps.append(range(plan_range))
+        else:
+            steps.append(range(2))
+        colors.append(value['color'])
+        configs.append(value)
 
-    # Curling constraints go from [2,...,Np] and enforce curing (Questionable functionality)
-    if args.force_curl:
-        for r in robots:
-            v = velocity_correction[r]
-            x_delta = 1
-            x_t_delta = 2
-            y_delta = 1
-            y_t_delta = 2
+    temp_len = [len(s) for s in steps]
+    steps = [steps[np.argmax(temp_len)]]*len(steps) # This makes everything operate at the same time
+    velocity_correction = [t/max(temp_len) for t in temp_len] # To account for time difference between arriving to waypoints
 
-            # This for x motion
-            m.addConstrs(x[r,t-x_t_delta] - x[r,t] <= v*x_delta for t in steps[r][x_t_delta:])
-            m.addConstrs(x[r,t] - x[r,t-x_t_delta] <= v*x_delta for t in steps[r][x_t_delta:])
-            # t_range = range(2)
-            # M = 1000
-            # t1 = m.addVars(steps[r][y_t_delta:], t_range, vtype=GRB.BINARY, name='t1')
-            # m.addConstrs(y[r,t-y_t_delta] - y[r,t] >= v*y_delta - M*t1[t,0] for t in steps[r][y_t_delta:])
-            # m.addConstrs(y[r,t] - y[r,t-y_t_delta] >= v*y_delta - M*t1[t,1] for t in steps[r][y_t_delta:])
-            # m.addConstrs(t1[t,0] + t1[t,1]  <= 1 for t in steps[r][y_t_delta:])
-            m.addConstrs(y[r,t-y_t_delta] - y[r,t] <= v*y_delta for t in steps[r][y_t_delta:])
-            m.addConstrs(y[r,t] - y[r,t-y_t_delta] <= v*y_delta for t in steps[r][y_t_delta:])
+    if args.formulation == 'flow' and min(velocity_correction) < 1:
+        print("The flow formulation needs all robots to move one grid cell per step, using the sos2 formulation instead.")
+        args.formulation = 'sos2'
+    # velocity_correction = [1 for t in temp_len] # To account for time difference between arriving to waypoints
 
-            # This is for y motion
-            # m.addConstrs(y[r,t-y_t_delta] - y[r,t] <= v*y_delta for t in steps[r][y_t_delta:])
-            # m.addConstrs(y[r,t] - y[r,t-y_t_delta] <= v*y_delta for t in steps[r][y_t_delta:])
-            # t_range = range(2)
-            # M = 1000
-            # t1 = m.addVars(steps[r][x_t_delta:], t_range, vtype=GRB.BINARY, name='t1')
-            # m.addConstrs(x[r,t-x_t_delta] - x[r,t] >= v*x_delta - M*t1[t,0] for t in steps[r][x_t_delta:])
-            # m.addConstrs(x[r,t] - x[r,t-x_t_delta] >= v*x_delta - M*t1[t,1] for t in steps[r][x_t_delta:])
-            # m.addConstrs(t1[t,0] + t1[t,1]  <= 1 for t in steps[r][x_t_delta:])
-            # m.addConstrs(y[r,t-t_delta] - y[r,t] <= v*y_delta for t in steps[r][t_delta:])
-            # m.addConstrs(y[r,t] - y[r,t-t_delta] <= v*y_delta for t in steps[r][t_delta:])
+    # Make time correction for map forward propagation. All robots share the steps,
+    # which are sized for the fastest robot to move one grid cell, so step t is
+    # reached t*step_hours into the mission.
+    max_steps = max([len(s) for s in steps])
+    step_hours = min(field_resolution)/(max([c['vel'] for c in configs])*60*60*0.001)
+    arrival_times = np.arange(max_steps)*step_hours
 
-    # Straight path constraints (Questionable functionality)
-    if len(args.straight_line) > 0:
-        # Now we need to correct our previous velocity_correction by making sure the edges are the lengths of the edges are all equal.
-        path_len_x = args.straight_line[0]
-        path_len_y = args.straight_line[1]
-        delta = max(path_len_x,path_len_y)
-        print(delta, path_len_y)
-        M = 1000
-        for r in robots:
-            for v in velocity_correction:
-                inv_v = 1/v
-                if inv_v > 1:
-                    tv = m.addVars(steps[r][delta:], range(4), vtype=GRB.BINARY, name='t1')
-                    for t in steps[r][delta:]:
-                        m.addConstr(x[r,t-delta] - x[r,t] >= path_len_x*v - M*tv[t,0] )
-                        m.addConstr(x[r,t] - x[r,t-delta] >= path_len_x*v - M*tv[t,1] )
-                        m.addConstr(y[r,t-delta] - y[r,t] >= path_len_y*v - M*tv[t,2] )
-                        m.addConstr(y[r,t] - y[r,t-delta] >= path_len_y*v - M*tv[t,3] )
-                        m.addConstr(tv[t,0] + tv[t,1] + tv[t,2] + tv[t,3] == 3 )
-                else:
-                    # Working better
-                    ts = m.addVars(steps[r][delta:], range(4), vtype=GRB.BINARY, name='ts')
-                    for t in steps[r][delta:]:
-                        m.addConstr(x[r,t-path_len_x] - x[r,t] >= path_len_x - M*ts[t,0])
-                        m.addConstr(x[r,t] - x[r,t-path_len_x] >= path_len_x - M*ts[t,1])
-                        m.addConstr(y[r,t-path_len_y] - y[r,t] >= path_len_y - M*ts[t,2])
-                        m.addConstr(y[r,t] - y[r,t-path_len_y] >= path_len_y - M*ts[t,3])
-                        m.addConstr(ts[t,0] + ts[t,1] + ts[t,2] + ts[t,3] == 3 )
-                        #
+    # The field at the arrival time of each step, used to score the paths.
+    time_field = coefficient_tensor(field, arrival_times)
 
-    # Area Constraint (Start with square, expand to more complex shapes)
-    if len(args.rect_area) > 0:
-        for r in robots:
-            area = args.rect_area
-            m.addConstrs(x[r,t] >= area[0] for t in steps[r][1:])
-            m.addConstrs(x[r,t] <= area[1] for t in steps[r][1:])
-            m.addConstrs(y[r,t] >= area[2] for t in steps[r][1:])
-            m.addConstrs(y[r,t] <= area[3] for t in steps[r][1:])
+    # Number of robots we are planning for.
+    robots = range(len(args.robots))
 
-    # End constraint updates, seting objective
-    m.update()
-    obj = quicksum(f[r,t] for r in robots for t in steps[r])
-    m.setObjective(obj, GRB.MAXIMIZE)
+    # Starting position contraint
+    start = args.start_point
+    if len(start) > 2:
+        # More than one robot.
+        start = [start[i:i + 2] for i in range(0, len(start), 2)]
+    else:
+        # One robot, extra list needed for nesting reasons.
+        start = [start]
 
-    # Run the optimizer
-    m.optimize()
+    # The field value at each step, what the lambda weights get multiplied by for f.
+    # A (T,X,Y) array shared by all robots, so static and time varying maps are
+    # built the same way.
+    if args.gradient:
+        field_slices = np.broadcast_to(mag_grad_field, (max_steps,) + mag_grad_field.shape)
+    elif args.time_vary:
+        field_slices = time_field
+    else:
+        field_slices = np.broadcast_to(field[:,:,0], (max_steps,) + field.shape[:2])
+
+    if len(args.multi_start) > 0:
+        multi_start(args, yaml_sim, field, steps, velocity_correction, field_slices, time_field, configs)
+        return None
+
+    trace_file = ''
+    cached = None
+    if len(args.cache_dir) > 0:
+        key = cache_key(args, field_slices, steps, velocity_correction, start, configs)
+        if not args.force_solve:
+            cached = load_result(args.cache_dir, key)
+    solved = None
+    if cached is not None:
+        paths = [[tuple(p) for p in path] for path in cached['paths']]
+        objective = cached['objective']
+        run_time = cached['run_time']
+        print("Cached result %s from %s, objective %f" % (key[:12], cached['created'], objective))
+    elif args.portfolio is not None:
+        paths, objective, run_time = portfolio(args, steps, velocity_correction, start, field_slices, configs)
+        if paths is None:
+            print("No portfolio member found a plan.")
+            return None
+        print("Portfolio objective %f, wall time (sec): %f" % (objective, run_time))
+    elif args.decompose:
+        paths, objective, dual, run_time = decompose(args, steps, velocity_correction, start, field_slices, configs)
+        if paths is None:
+            print("The decomposition found no plan.")
+            return None
+        print("Decomposition objective %f, Lagrangian relaxation bound %f (one robot per grid point only), wall time (sec): %f" % (objective, dual, run_time))
+    elif args.horizon > 0:
+        window = max(int(np.round((max_steps - 1)*args.horizon/Np)), 1)
+        commit = args.commit_steps if args.commit_steps > 0 else max(window//2, 1)
+        print("Receding horizon: windows of %d steps, keeping %d steps of each." % (window, commit))
+        paths, objective, run_time = receding_horizon(args, field, steps, velocity_correction, start, field_slices, window, commit, configs)
+        print("Receding horizon objective %f, total wall time (sec): %f" % (objective, run_time))
+
+        if args.horizon_compare:
+            # Solve the whole mission as one model to see what the windows gave up.
+            m, model_vars = build_model(args, steps, velocity_correction, start, field_slices, args.end_point, configs)
+            solve_model(m, model_vars, args, steps)
+            if m.SolCount > 0:
+                gap = (m.ObjVal - objective)/abs(m.ObjVal) if m.ObjVal != 0 else 0.0
+                print("Monolithic objective %f in %f sec, receding horizon gap %.2f%%" % (m.ObjVal, m.Runtime, 100*gap))
+            else:
+                print("Monolithic solve found no solution to compare against.")
+    elif args.coarse > 1:
+        m, model_vars, trace, run_time = coarse_to_fine(args, steps, velocity_correction, start, field_slices, configs)
+        trace_file = save_trace(args, trace, args.start_point)
+        paths = get_paths(m, model_vars, steps)
+        objective = m.ObjVal
+        print("Coarse to fine objective %f, total solve time (sec): %f" % (objective, run_time))
+    else:
+        m, model_vars = build_model(args, steps, velocity_correction, start, field_slices, args.end_point, configs)
+
+        cutoff = False
+        if previous is not None and len(previous[0][0]) < len(steps[0]) and args.backend == 'gurobi':
+            # Every step of the shorter plan can still be made with the larger budget,
+            # so this plan scores at least as well (the field is not negative). Its
+            # extension is the MIP start and its objective the cutoff.
+            load_start(model_vars, args, extend_start(args, field, steps, velocity_correction, previous[0]), field_slices)
+            if len(args.end_point) == 0 and np.min(field_slices) >= 0:
+                m.Params.Cutoff = previous[1] - 1e-6*max(1.0, abs(previous[1]))
+                cutoff = True
+        else:
+            warm_start(model_vars, args, field, steps, velocity_correction, start, field_slices)
+
+        trace = solve_model(m, model_vars, args, steps)
+        if cutoff and m.SolCount == 0 and m.Status != GRB.TIME_LIMIT:
+            print("Nothing found above the cutoff from the smaller budget, solving again without it.")
+            m.Params.Cutoff = -GRB.INFINITY
+            trace = solve_model(m, model_vars, args, steps)
+        trace_file = save_trace(args, trace, args.start_point)
+        paths = get_paths(m, model_vars, steps)
+        objective = m.ObjVal
+        run_time = m.Runtime
+        solved = m
+
+    if len(args.cache_dir) > 0 and cached is None:
+        store_result(args.cache_dir, key, args, paths, objective, run_time, solved)
 
     # Print the variable values
     # path = np.zeros(Np)
@@ -690,15 +2143,6 @@ def main():
     if args.gen_image:
 
         # Plotting Code
-        path_x = m.getAttr('X', x).values()
-        path_y = m.getAttr('X', y).values()
-        # print('Obj: %g' % obj.getValue())
-        _paths = list(zip(path_x, path_y))
-        paths = []
-        for r in robots:
-            paths.append(_paths[0:len(steps[r])])
-            _paths = _paths[len(steps[r]):]
-
         print(paths)
         dist=paths[0][:]
         print(sum([np.sqrt( (dist[i][0]-dist[i+1][0])**2 + (dist[i][1]-dist[i+1][1])**2) for i,p in enumerate(dist[:-1])]))
@@ -817,8 +2261,7 @@ def main():
             rect_area_str = ''
 
         if args.time_vary:
-            obj = m.getObjective()
-            score_str = '_score_%f' % obj.getValue()
+            score_str = '_score_%f' % objective
         else:
             # m.addConstrs((quicksum(field[i,j,field_time_steps[t]]*lxy[r,t,i,j] for i in DX for j in DY) == f[r,t] for r in robots for t in steps[r]))
             score_str = '_score_%f' % sum([bilinear_interpolation(p, field) for path in paths for p in path])
@@ -843,106 +2286,11 @@ def main():
         plt.show()
     else:
         # Plotting Code
-        path_x = m.getAttr('X', x).values()
-        path_y = m.getAttr('X', y).values()
-        # print('Obj: %g' % obj.getValue())
-        _paths = list(zip(path_x, path_y))
-        paths = []
-        for r in robots:
-            paths.append(_paths[0:len(steps[r])])
-            _paths = _paths[len(steps[r]):]
-
         print(paths)
 
-        filename = args.outfile_path
-        check_empty = os.path.exists(filename)
-
-        if args.direction_constr == 'nsew':
-            dir_str = '_%s' % args.direction_constr
-        elif args.direction_constr == 'diag':
-            dir_str = '_%s' % args.direction_constr
-        else:
-            dir_str = ''
-
-        if args.collision_rad > 0:
-            collision_str = '_collRad_%d' % args.collision_rad
-        else:
-            collision_str = ''
-
-        if args.anti_curl:
-            anti_curl_str = '_antiCurl'
-        else:
-            anti_curl_str = ''
-
-        if args.force_curl:
-            force_curl_str = '_forceCurl'
-        else:
-            force_curl_str = ''
-
-        if len(args.straight_line) > 0:
-            straight_line_str = '_straight_%d_%d' % (args.straight_line[0], args.straight_line[1])
-        else:
-            straight_line_str = ''
-
-        if len(args.rect_area) > 0:
-            area = args.rect_area
-            rect_area_str = '_rect_x%d_%dy%d_%d' % (area[0], area[1], area[2], area[3])
-        else:
-            rect_area_str = ''
-
-        if len(args.sync) > 0:
-            sync_str = 'sync'
-        else:
-            sync_str =''
-
-        constraint_string = collision_str + \
-                            dir_str + anti_curl_str + \
-                            force_curl_str + \
-                            straight_line_str + \
-                            rect_area_str + \
-                            sync_str
+        write_csv_row(args, yaml_sim, args.start_point, paths, objective, run_time, time_field, trace_file)
 
-        if args.time_vary:
-            obj = m.getObjective()
-            score_str = obj.getValue()
-            alg_str = "MIP_Time_Vary"
-        else:
-            score_str = sum([bilinear_interpolation(p, field, field_time_steps[t]) for path in paths for t,p in enumerate(path)])
-            alg_str = "MIP"
-        # obj = m.getObjective()
-        # score_str = obj.getValue()
-
-        with open(filename, 'a', newline='') as csvfile:
-            fieldnames = [  'Experiment', \
-                            'Algorithm', \
-                            'Map', \
-                            'Map Center', \
-                            'Map Resolution', \
-                            'Start Point', \
-                            'End Point', \
-                            'Score', \
-                            'Run Time (sec)', \
-                            'Budget (hours)', \
-                            'Number of Robots', \
-                            'Constraints']
-
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if not check_empty:
-                print("File is empty")
-                writer.writeheader()
-
-            writer.writerow({   'Experiment': args.experiment_name, \
-                                'Algorithm': alg_str, \
-                                'Map': str(yaml_sim['roms_file']), \
-                                'Map Center': Location(xlon=yaml_sim['sim_world']['center_longitude'], ylat=yaml_sim['sim_world']['center_latitude']).__str__(), \
-                                'Map Resolution': (yaml_sim['sim_world']['resolution'],yaml_sim['sim_world']['resolution']), \
-                                'Start Point': args.start_point, \
-                                'End Point': args.end_point if len(args.end_point) > 0 else 'NA' , \
-                                'Score': score_str, \
-                                'Run Time (sec)': m.Runtime, \
-                                'Budget (hours)': args.planning_time, \
-                                'Number of Robots': len(args.robots), \
-                                'Constraints': constraint_string})
+    return paths, objective
 
 
 
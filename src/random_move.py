@@ -171,6 +171,13 @@ def main():
         action='store_false',
         help='By default it will not allow a point to be visited twice in the same planning period.',
         )
+    parser.add_argument(
+        '--save_path',
+        nargs='?',
+        type=str,
+        default='',
+        help='Saves the planned paths to this .npy file, can be loaded by mip_test.py --warm_start.',
+        )
     parser.add_argument(
         '--gen_image',
         action='store_true',
@@ -355,6 +362,9 @@ def main():
     # print(paths)
     runTime = time.time() - startTime
 
+    if len(args.save_path) > 0:
+        np.save(args.save_path, np.array(paths, dtype=float))
+
     if args.gen_image:
         wd = World.roms(
             datafile_path=yaml_sim['roms_file'],
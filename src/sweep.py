@@ -0,0 +1,84 @@
+"""
+Batch experiments for the planners (mip_test.py, greedy.py, mcts.py).
+
+Running a sweep from a shell loop pays for starting Python, importing gurobipy and
+matplotlib, parsing the yaml files and loading the field for every configuration.
+With the --sweep_* arguments below one process runs the whole sweep instead and
+appends one CSV row per configuration:
+
+    --sweep_starts   start points, [x0,y0,...,xN,yN] for each start of N robots
+    --sweep_budgets  budgets in hours, used instead of -n
+    --sweep_centers  sim world centers as longitude latitude pairs, used instead of
+                     the center in --sim_cfg
+
+The yaml files and saved fields are read once and kept for the rest of the sweep.
+"""
+
+import os, copy, itertools
+import oyaml as yaml
+import numpy as np
+
+_yaml_cache = {}
+_field_cache = {}
+
+def add_sweep_args(parser):
+    parser.add_argument(
+        '--sweep_starts',
+        nargs='*',
+        type=int,
+        default=[],
+        help='Start points to sweep over, [x0,y0,...,xN,yN] for each start of N robots. Replaces --start_point.',
+        )
+    parser.add_argument(
+        '--sweep_budgets',
+        nargs='*',
+        type=float,
+        default=[],
+        help='Budgets (hours) to sweep over. Replaces --planning_time.',
+        )
+    parser.add_argument(
+        '--sweep_centers',
+        nargs='*',
+        type=float,
+        default=[],
+        help='Sim world centers to sweep over as longitude latitude pairs, e.g. -91.7 29.0 -92.5 28.5. Replaces the center in --sim_cfg.',
+        )
+
+def sweep_configs(args, budgets_last=False):
+    # Yields a copy of args for every (center, budget, start) of the sweep. The
+    # center is put in args.sim_center, None keeps the one from --sim_cfg. With
+    # budgets_last the budgets of each (center, start) come one after the other in
+    # increasing order, so a run can build on the one before it.
+    n = 2*len(args.robots)
+    starts = [args.sweep_starts[i:i + n] for i in range(0, len(args.sweep_starts), n)] or [args.start_point]
+    budgets = args.sweep_budgets or [args.planning_time]
+    centers = [args.sweep_centers[i:i + 2] for i in range(0, len(args.sweep_centers), 2)] or [None]
+    if budgets_last:
+        configs = [(center, budget, start) for center, start, budget in itertools.product(centers, starts, sorted(budgets))]
+    else:
+        configs = itertools.product(centers, budgets, starts)
+    for center, budget, start in configs:
+        run_args = copy.copy(args)
+        run_args.sim_center = center
+        run_args.planning_time = budget
+        run_args.start_point = list(start)
+        yield run_args
+
+def load_yaml(path, center=None):
+    # A yaml file, only parsed the first time it is asked for. With a center
+    # (longitude, latitude) the sim_world center is replaced in the returned copy.
+    path = os.path.expandvars(path)
+    if path not in _yaml_cache:
+        with open(path,'rb') as f:
+            _yaml_cache[path] = yaml.load(f.read())
+    config = copy.deepcopy(_yaml_cache[path])
+    if center is not None:
+        config['sim_world']['center_longitude'] = center[0]
+        config['sim_world']['center_latitude'] = center[1]
+    return config
+
+def load_saved_field(path):
+    # np.load of a saved field, each file is only read once.
+    if path not in _field_cache:
+        _field_cache[path] = np.load(path)
+    return _field_cache[path]
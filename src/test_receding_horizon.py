@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from mip_test import get_parser, receding_horizon, build_model, solve_model
+
+def hot_cell_problem(extra_args):
+    # 7x7 field of ones with one hot cell at the start, so going back to it is the
+    # best move of every window once the robot has left it.
+    args = get_parser().parse_args(['--backend', 'highs', '-r', 'glider1', '-s', '3', '3'] + extra_args)
+    field = np.ones((7, 7, 1))
+    field[3, 3, 0] = 10
+    steps = [range(5)]
+    field_slices = np.broadcast_to(field[:, :, 0], (len(steps[0]), 7, 7))
+    return args, field, steps, [1.0], [[3, 3]], field_slices
+
+@pytest.mark.parametrize('extra_args', [[], ['--revisit_encoding', 'occupancy'], ['--formulation', 'flow']])
+def test_receding_horizon_does_not_revisit(extra_args):
+    args, field, steps, velocity_correction, start, field_slices = hot_cell_problem(extra_args)
+    paths, objective, run_time = receding_horizon(args, field, steps, velocity_correction, start, field_slices, 1, 1)
+
+    points = [(int(np.round(p[0])), int(np.round(p[1]))) for p in paths[0]]
+    assert len(points) == len(steps[0])
+    assert len(set(points)) == len(points)
+
+    m, model_vars = build_model(args, steps, velocity_correction, start, field_slices)
+    solve_model(m, model_vars, args, steps)
+    assert objective <= m.ObjVal + 1e-6
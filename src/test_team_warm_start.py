@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from mip_test import get_parser, build_model, warm_start, paths_collide
+from greedy import team_greedy_paths, get_directions, point_keys
+
+gurobipy = pytest.importorskip('gurobipy')
+
+def team_problem(extra_args):
+    # Two robots on a random 7x7 field where keeping apart step by step is not
+    # enough, the second one has to cross over the first to follow its best moves.
+    args = get_parser().parse_args(['-r', 'glider1', 'glider2', '-s', '4', '0', '5', '2', '-c', '2',
+                                    '--warm_start', 'team'] + extra_args)
+    field = np.random.RandomState(6).rand(7, 7, 1)
+    steps = [range(5), range(5)]
+    field_slices = np.broadcast_to(field[:,:,0], (len(steps[0]), 7, 7))
+    return args, field, steps, [1.0, 1.0], [[4, 0], [5, 2]], field_slices
+
+def test_team_greedy_keeps_the_mip_constraints():
+    args, field, steps, velocity_correction, start, field_slices = team_problem([])
+    paths = team_greedy_paths(field, start, len(steps[0]), velocity_correction, get_directions(args.direction_constr), True, args.collision_rad)
+    assert not paths_collide(paths, steps, args.collision_rad)
+    assert all(len(set(point_keys(path))) == len(path) for path in paths)
+
+@pytest.mark.parametrize('extra_args', [[], ['--formulation', 'flow']])
+def test_team_start_is_accepted(extra_args):
+    args, field, steps, velocity_correction, start, field_slices = team_problem(extra_args)
+    m, model_vars = build_model(args, steps, velocity_correction, start, field_slices)
+    warm_start(model_vars, args, field, steps, velocity_correction, start, field_slices)
+    # No search and no heuristics, only the MIP start can give an incumbent.
+    m.Params.NodeLimit = 0
+    m.Params.Heuristics = 0
+    m.Params.OutputFlag = 0
+    m.optimize()
+    assert m.SolCount > 0
@@ -0,0 +1,238 @@
+#!/home/mlfrantz/miniconda2/bin/python3.6
+
+"""
+Solver parameter tuning for mip_test.py.
+
+The benchmark is the one of scripts/constraint_test.sh: 5 map centers x 9 start points
+x the budget set. Every candidate setting is run on the whole benchmark in this process
+(mip_test.py with the --sweep_* arguments) and scored by the shifted geometric mean of
+the run times. A candidate that loses more than 0.1% of the total score is not taken.
+The parameters are searched one at a time (coordinate search), starting from the
+Gurobi defaults.
+
+Everything goes in --out_dir:
+
+    runs.csv             the mip_test.py result row of every run
+    params_<label>.yaml  the parameter file of every candidate
+    best_params.yaml     the best one, load it with mip_test.py --param_file
+    tuning_results.yaml  the benchmark, the summary of every candidate and the result
+                         of the best one on every instance
+
+After a code change run "tune.py --check <out_dir>/tuning_results.yaml" to run the best
+setting on the stored benchmark again and list the instances that got worse.
+"""
+
+import sys, time, argparse, os, csv, shlex
+import oyaml as yaml
+import numpy as np
+import mip_test
+
+# Map centers (longitude latitude), start points and budgets of constraint_test.sh.
+CENTERS = [-92.7, 28.8, -93.25, 28.75, -96.5, 25.0, -91.19, 28.82, -91.7, 29.0]
+STARTS = [1,1, 1,5, 1,9, 5,1, 5,5, 5,9, 9,1, 9,5, 9,9]
+BUDGETS = [1, 2, 4, 8, 10]
+
+# Values tried for each parameter, the first one is the Gurobi default.
+SEARCH_SPACE = [
+    ('MIPFocus', [0, 1, 2, 3]),
+    ('Heuristics', [0.05, 0.2, 0.5]),
+    ('Cuts', [-1, 0, 2]),
+    ('Presolve', [-1, 0, 2]),
+    ('Threads', [0, 1]),
+    ('BranchPriority', ['none', 'b', 'lambda']),
+    ]
+
+def shifted_geomean(values, shift=1.0):
+    return float(np.exp(np.mean(np.log(np.array(values) + shift))) - shift)
+
+def param_label(params):
+    return '_'.join(['%s=%s' % (key, value) for key, value in params.items()])
+
+def write_param_file(params, filename):
+    # Parameter file for mip_test.py --param_file, defaults of ours are left out.
+    with open(filename, 'w') as f:
+        yaml.dump({key: value for key, value in params.items() if value != 'none'}, f, default_flow_style=False)
+
+def run_benchmark(args, params, label):
+    # Runs mip_test.py with params on the whole benchmark. Returns the results as
+    # {(center, start, budget): (score, run time)}.
+    param_file = os.path.join(args.out_dir, 'params_%s.yaml' % label)
+    write_param_file(params, param_file)
+    runs_file = os.path.join(args.out_dir, 'runs.csv')
+    argv = ['--sweep_centers'] + [str(c) for c in args.centers] + \
+           ['--sweep_starts'] + [str(s) for s in args.starts] + \
+           ['--sweep_budgets'] + [str(b) for b in args.budgets] + \
+           ['-t', str(args.time_limit), '-r'] + args.robots + \
+           ['-o', runs_file, '--experiment_name', label, '--param_file', param_file, '--sim_cfg', args.sim_cfg] + \
+           shlex.split(args.mip_args)
+    mip_test.main(argv)
+
+    results = {}
+    with open(runs_file, newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            if row['Experiment'] == label:
+                key = (row['Map Center'], row['Start Point'], float(row['Budget (hours)']))
+                results[key] = (float(row['Score']), float(row['Run Time (sec)']))
+    return results
+
+def summarize(results):
+    return {'metric': shifted_geomean([t for score, t in results.values()]),
+            'total_score': float(sum([score for score, t in results.values()])),
+            'runs': len(results)}
+
+def tune(args):
+    os.makedirs(args.out_dir, exist_ok=True)
+    summaries = {}
+    all_results = {}
+
+    def evaluate(params):
+        label = param_label(params)
+        if label not in summaries:
+            print("Running the benchmark with %s" % label)
+            all_results[label] = run_benchmark(args, params, label)
+            summaries[label] = summarize(all_results[label])
+            print("%s: shifted geometric mean run time %f sec, total score %f" % (label, summaries[label]['metric'], summaries[label]['total_score']))
+        return summaries[label]
+
+    best = dict([(name, values[0]) for name, values in SEARCH_SPACE])
+    best_summary = evaluate(best)
+    min_score = best_summary['total_score']*(1 - 1e-3)
+    for name, values in SEARCH_SPACE:
+        for value in values:
+            candidate = dict(best)
+            candidate[name] = value
+            summary = evaluate(candidate)
+            if summary['metric'] < best_summary['metric'] and summary['total_score'] >= min_score:
+                best = candidate
+                best_summary = summary
+        print("Best %s: %s" % (name, best[name]))
+
+    best_label = param_label(best)
+    write_param_file(best, os.path.join(args.out_dir, 'best_params.yaml'))
+    stored = {'benchmark': {'centers': args.centers, 'starts': args.starts, 'budgets': args.budgets, 'time_limit': args.time_limit,
+                            'robots': args.robots, 'sim_cfg': args.sim_cfg, 'mip_args': args.mip_args},
+              'best': best_label,
+              'best_params': best,
+              'candidates': summaries,
+              'best_results': [{'center': c, 'start': s, 'budget': b, 'score': score, 'run_time': t}
+                               for (c, s, b), (score, t) in sorted(all_results[best_label].items())]}
+    with open(os.path.join(args.out_dir, 'tuning_results.yaml'), 'w') as f:
+        yaml.dump(stored, f, default_flow_style=False)
+    print("Best setting %s, written to %s" % (best_label, os.path.join(args.out_dir, 'best_params.yaml')))
+
+def check(args):
+    # Runs the best setting of a stored tuning on its benchmark again and compares.
+    with open(args.check, 'rb') as f:
+        stored = yaml.load(f.read())
+    for key, value in stored['benchmark'].items():
+        setattr(args, key, value)
+    os.makedirs(args.out_dir, exist_ok=True)
+    label = 'check_' + time.strftime("%Y%m%d-%H%M%S")
+    results = run_benchmark(args, stored['best_params'], label)
+    summary = summarize(results)
+    old = stored['candidates'][stored['best']]
+
+    worse = 0
+    for r in stored['best_results']:
+        key = (r['center'], r['start'], r['budget'])
+        if key not in results:
+            print("Missing run %s" % (key,))
+            worse += 1
+            continue
+        score, t = results[key]
+        if score < r['score'] - args.score_tol*abs(r['score']) or t > args.time_factor*r['run_time'] + 1.0:
+            print("Worse on %s: score %f (was %f), run time %f sec (was %f)" % (key, score, r['score'], t, r['run_time']))
+            worse += 1
+    print("Shifted geometric mean run time %f sec (was %f), total score %f (was %f), %d of %d runs worse" % \
+          (summary['metric'], old['metric'], summary['total_score'], old['total_score'], worse, len(stored['best_results'])))
+    return worse
+
+def main():
+    parser = argparse.ArgumentParser(description='Solver parameter tuning for mip_test.py')
+    parser.add_argument(
+        '--out_dir',
+        nargs='?',
+        type=str,
+        default='/home/mlfrantz/Documents/MIP_Research/mip_research/data/tuning/',
+        help='Directory for the runs, parameter files and stored results.',
+        )
+    parser.add_argument(
+        '--centers',
+        nargs='*',
+        type=float,
+        default=CENTERS,
+        help='Map centers of the benchmark as longitude latitude pairs. Default is the 5 maps of constraint_test.sh.',
+        )
+    parser.add_argument(
+        '--starts',
+        nargs='*',
+        type=int,
+        default=STARTS,
+        help='Start points of the benchmark, [x0,y0,...,xN,yN] for each start of N robots. Default is the 9 start points of constraint_test.sh.',
+        )
+    parser.add_argument(
+        '--budgets',
+        nargs='*',
+        type=float,
+        default=BUDGETS,
+        help='Budgets (hours) of the benchmark.',
+        )
+    parser.add_argument(
+        '-t', '--time_limit',
+        nargs='?',
+        type=float,
+        default=60,
+        help='Time limit (sec) of every run.',
+        )
+    parser.add_argument(
+        '-r', '--robots',
+        nargs='*',
+        type=str,
+        default=['glider1'],
+        help='List of robots to plan for. Must be in the robots.yaml file.',
+        )
+    parser.add_argument(
+        '--sim_cfg',
+        nargs='?',
+        type=str,
+        default=os.getenv("HOME") + '/Documents/MIP_Research/mip_research/cfg/sim.yaml',
+        help='sim.yaml Configuration file.',
+        )
+    parser.add_argument(
+        '--mip_args',
+        nargs='?',
+        type=str,
+        default='',
+        help='Other mip_test.py arguments for every run, e.g. "--force_curl -d nsew".',
+        )
+    parser.add_argument(
+        '--check',
+        nargs='?',
+        type=str,
+        default='',
+        help='A tuning_results.yaml to check the current code against instead of tuning.',
+        )
+    parser.add_argument(
+        '--score_tol',
+        nargs='?',
+        type=float,
+        default=1e-3,
+        help='Relative score loss a --check run may have before it counts as worse.',
+        )
+    parser.add_argument(
+        '--time_factor',
+        nargs='?',
+        type=float,
+        default=1.5,
+        help='Factor the run time of a --check run may grow by (plus 1 sec) before it counts as worse.',
+        )
+
+    args = parser.parse_args()
+
+    if len(args.check) > 0:
+        sys.exit(1 if check(args) > 0 else 0)
+    else:
+        tune(args)
+
+if __name__ == '__main__':
+    main()